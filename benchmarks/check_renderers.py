@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Checks that every way quizgen renders a quiz gives the same markup as the
+reference minidom renderer, render_quiz(quiz, reference=True):
+
+  direct       render_quiz(quiz)
+  stream       write_quiz of QuizParser.stream(), as --stream does
+  prerendered  PrerenderedQuiz put in the page order, as --variants does
+  render cache RenderCache.render_quiz, cold and then warm
+
+The pages are compared as normalized HTML: tags, sorted attributes and text
+with runs of whitespace collapsed, since the renderers indent differently.
+
+  python benchmarks/check_renderers.py
+  python benchmarks/check_renderers.py path/to/quizzes other.quiz --synthetic 5
+
+Without paths, sample.quiz and the quizzes of ee103/ and ee364a/ are checked.
+A few quizzes made to trip up the splitting of the render cache are always
+checked too.
+The exit status is 1 if any page differs.
+"""
+import argparse
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+from html.parser import HTMLParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import quizgen
+from generate import generate_quiz
+
+
+class _Tokenizer(HTMLParser):
+  def __init__(self):
+    HTMLParser.__init__(self, convert_charrefs=True)
+    self.tokens = []
+
+
+  def handle_starttag(self, tag, attributes):
+    self.tokens.append(('<', tag, tuple(sorted((name, value or '') for name, value in attributes))))
+
+
+  def handle_startendtag(self, tag, attributes):
+    self.handle_starttag(tag, attributes)
+    self.handle_endtag(tag)
+
+
+  def handle_endtag(self, tag):
+    self.tokens.append(('</', tag))
+
+
+  def handle_data(self, data):
+    text = ' '.join(data.split())
+    if not text:
+      return
+    if self.tokens and self.tokens[-1][0] == 'text':
+      self.tokens[-1] = ('text', self.tokens[-1][1] + ' ' + text)
+    else:
+      self.tokens.append(('text', text))
+
+
+def normalize(html):
+  """
+  Returns the tokens of an HTML fragment, without the differences in
+  whitespace and attribute order that do not change the page
+  """
+  tokenizer = _Tokenizer()
+  tokenizer.feed(html)
+  tokenizer.close()
+  return tokenizer.tokens
+
+
+def _stream(filename, text, cache_filename):
+  out = io.StringIO()
+  quizgen.write_quiz(quizgen.QuizParser(filename).stream(), out)
+  return out.getvalue()
+
+
+def _prerendered(filename, text, cache_filename):
+  quiz = quizgen.parse_quiz(text, shuffle=False, name=filename)
+  seed = quizgen.QuizParser(filename).read_digest()
+  return quizgen.PrerenderedQuiz(quiz).render(*quizgen.get_page_orders(quiz, seed))
+
+
+def _render_cache(filename, text, cache_filename):
+  cache = quizgen.RenderCache(cache_filename)
+  try:
+    cold = cache.render_quiz(text, filename)[1]
+    cache.flush()
+    # A new cache only finds the problem groups on disk
+    warm = quizgen.RenderCache(cache_filename)
+    try:
+      return cold, warm.render_quiz(text, filename)[1]
+    finally:
+      warm.close()
+  finally:
+    cache.close()
+
+
+RENDERERS = (
+  ('direct', lambda filename, text, cache_filename: quizgen.render_quiz(
+      quizgen.parse_quiz(text, name=filename))),
+  ('stream', _stream),
+  ('prerendered', _prerendered),
+  ('render cache', _render_cache),
+)
+
+
+# Quizzes whose problem groups are hard to find without the parser's rules:
+# blank lines holding Unicode spaces, titles that follow each other, a title
+# right after the quiz title and a blank line dropped before options
+EDGE_CASES = (
+  u'== Blank\n\n[A]\nq\n*= a\n\u00a0\n[B]\nr\n*= b\n',
+  u'== Titles\n\n[A]\n[B]\nq\n*= a\n\n[C]\n[D]\nr\n*= b\n\n[E]\ns\n*= c\n',
+  u'== Title\n[A]\nq\n*= a\n\u2003\n\u00a0[B] tags=x\nintro\n\nr\n\n*= b\n= c\n',
+  u'== Returns\r\n\r\n[A]\r\nq\r\n*= a\r\n \r\n[B]\r\n[C]\r\nr\r\n*= b',
+)
+
+
+def _first_difference(expected, actual):
+  for i, (a, b) in enumerate(zip(expected, actual)):
+    if a != b:
+      return 'token %d: expected %r, got %r' % (i, a, b)
+  return 'expected %d tokens, got %d' % (len(expected), len(actual))
+
+
+def check_file(filename, cache_filename):
+  """
+  Returns a list of (renderer, difference) for every renderer whose page is
+  not the same as the reference one
+  """
+  text = quizgen.read_quiz_file(filename)
+  reference = normalize(quizgen.render_quiz(quizgen.parse_quiz(text, name=filename),
+                                            reference=True))
+  differences = []
+  for name, renderer in RENDERERS:
+    pages = renderer(filename, text, cache_filename)
+    for page in (pages if isinstance(pages, tuple) else (pages,)):
+      tokens = normalize(page)
+      if tokens != reference:
+        differences.append((name, _first_difference(reference, tokens)))
+        break
+  return differences
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+  parser.add_argument('paths', nargs='*', help='quiz files or directories')
+  parser.add_argument('--synthetic', type=int, default=0,
+                      help='also check this many synthetic quizzes full of LaTeX and markup')
+  args = parser.parse_args(argv)
+
+  if args.paths:
+    filenames = quizgen.expand_quiz_filenames(args.paths)
+  else:
+    filenames = [os.path.join(ROOT, 'sample.quiz')]
+    for directory in ('ee103', 'ee364a'):
+      filenames.extend(sorted(glob.glob(os.path.join(ROOT, directory, '*.quiz'))))
+
+  directory = tempfile.mkdtemp(prefix='quizgen-renderers-')
+  try:
+    for i, text in enumerate(EDGE_CASES):
+      filename = os.path.join(directory, 'edge%d.quiz' % i)
+      with open(filename, 'w', encoding='utf8', newline='') as quiz_file:
+        quiz_file.write(text)
+      filenames.append(filename)
+    for seed in range(args.synthetic):
+      filename = os.path.join(directory, 'synthetic%d.quiz' % seed)
+      with open(filename, 'w', encoding='utf8') as quiz_file:
+        quiz_file.write(generate_quiz(seed, groups=10, markup_density=0.5))
+      filenames.append(filename)
+
+    failed = 0
+    for i, filename in enumerate(filenames):
+      # Every file gets an empty cache, so that the cold run renders everything
+      differences = check_file(filename, os.path.join(directory, 'fragments%d.sqlite' % i))
+      for renderer, difference in differences:
+        print ('%s: %s: %s' % (filename, renderer, difference))
+      failed += bool(differences)
+  finally:
+    shutil.rmtree(directory)
+  print ('%d of %d quizzes render the same in every way' % (len(filenames) - failed, len(filenames)))
+  return 1 if failed else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generates synthetic .quiz files for benchmarking quizgen.
+
+The output only depends on the seed and the parameters, so the same command
+always produces the same file:
+
+  python benchmarks/generate.py -o big.quiz --groups 200 --questions 5 --options 4
+"""
+import argparse
+import random
+import sys
+
+
+WORDS = ('matrix vector norm convex function set cone duality gradient hessian '
+         'optimal point feasible constraint objective linear quadratic program '
+         'solution bound least squares rank column row affine subspace basis '
+         'eigenvalue positive definite minimize maximize variable problem').split()
+
+LATEX = (
+  '$x_%d$',
+  '$\\|A x - b\\|_2^%d$',
+  '$\\sum_{i=1}^{%d} a_i x_i$',
+  '\\[\nf(x) = \\frac{1}{%d} x^T P x + q^T x + r\n\\]',
+)
+
+MARKUP = (
+  '||IMG:images/figure%d.png||',
+  '||LINK: http://example.com/page%d||',
+  '||CODE:python:\nfor i in range(%d):\n    x = A.dot(x) & mask\n||',
+)
+
+
+def _sentence(rng, length, latex_density, markup_density):
+  words = [rng.choice(WORDS) for _ in range(length)]
+  if rng.random() < latex_density:
+    words.insert(rng.randrange(len(words) + 1), rng.choice(LATEX) % rng.randint(1, 9))
+  if rng.random() < markup_density:
+    words.insert(rng.randrange(len(words) + 1), rng.choice(MARKUP) % rng.randint(1, 9))
+  text = ' '.join(words)
+  return text[0].upper() + text[1:] + '.'
+
+
+def _text(rng, length, latex_density, markup_density):
+  """
+  Returns a few lines of text with about length words in total
+  """
+  lines = []
+  remaining = length
+  while remaining > 0:
+    words = min(remaining, rng.randint(6, 14))
+    lines.append(_sentence(rng, words, latex_density, markup_density))
+    remaining -= words
+  return '\n'.join(lines)
+
+
+def generate_quiz(seed=0, groups=20, questions=4, options=4, text_length=30,
+                  latex_density=0.3, markup_density=0.05, tags=0):
+  """
+  Returns the text of a synthetic quiz. groups, questions (per group) and
+  options (per question) set its shape, text_length is the number of words in
+  each description, and latex_density / markup_density are the probabilities
+  that a sentence contains LaTeX or ||CODE||/||IMG||/||LINK|| markup. With
+  tags, every problem group gets one or two of that many tags and a difficulty
+  from 1 to 3, for question bank benchmarks.
+  """
+  rng = random.Random(seed)
+  text = lambda length: _text(rng, length, latex_density, markup_density)
+  lines = ['== Synthetic quiz %d' % seed]
+  for g in range(groups):
+    title = '[Problem group %d]' % (g + 1)
+    if tags:
+      group_tags = sorted(set('topic%d' % rng.randrange(tags) for _ in range(rng.randint(1, 2))))
+      title += ' tags=%s difficulty=%d' % (','.join(group_tags), rng.randint(1, 3))
+    lines.append(title)
+    if rng.random() < 0.5:
+      lines.append(text(text_length))
+      lines.append('')
+    for q in range(questions):
+      lines.append(text(text_length))
+      correct = set(rng.sample(range(options), rng.choice((1, 1, 1, 2))))
+      for o in range(options):
+        option = '*= ' if o in correct else '* '
+        option += _sentence(rng, max(1, text_length // 4), latex_density, 0)
+        if rng.random() < 0.5:
+          option += ' :: ' + _sentence(rng, max(1, text_length // 3), latex_density, 0)
+        lines.append(option)
+      lines.append('')
+  return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Generate a synthetic .quiz file')
+  parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--groups', type=int, default=20)
+  parser.add_argument('--questions', type=int, default=4, help='questions per group')
+  parser.add_argument('--options', type=int, default=4, help='options per question')
+  parser.add_argument('--text-length', type=int, default=30, help='words per description')
+  parser.add_argument('--latex-density', type=float, default=0.3)
+  parser.add_argument('--markup-density', type=float, default=0.05)
+  parser.add_argument('--tags', type=int, default=0, help='number of tags of the problem groups')
+  args = parser.parse_args(argv)
+
+  quiz = generate_quiz(args.seed, args.groups, args.questions, args.options,
+                       args.text_length, args.latex_density, args.markup_density, args.tags)
+  if args.output:
+    with open(args.output, 'w', encoding='utf8') as output:
+      output.write(quiz)
+  else:
+    sys.stdout.write(quiz)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Times the stages of quizgen on synthetic quizzes and records peak memory.
+
+  python benchmarks/run.py -o before.json
+  (change quizgen/__init__.py)
+  python benchmarks/run.py -o after.json --compare before.json
+
+Each stage is timed separately: QuizParser.parse, create_dom_from_quiz,
+add_dom_to_template (minidom path) and render_quiz/Template.render (direct
+path). Peak memory of every stage is measured with tracemalloc in a separate
+run, so that tracing does not distort the timings.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import quizgen
+from generate import generate_quiz
+
+
+# name -> parameters of generate_quiz
+PRESETS = {
+  'small': dict(groups=10, questions=3, options=4, text_length=20),
+  'medium': dict(groups=100, questions=5, options=4, text_length=30),
+  'large': dict(groups=500, questions=10, options=5, text_length=40),
+  'markup': dict(groups=100, questions=5, options=4, text_length=60,
+                 latex_density=0.8, markup_density=0.5),
+}
+
+
+STAGES = ('parse', 'create_dom_from_quiz', 'add_dom_to_template', 'render_quiz',
+          'template_render', 'stream')
+
+
+def _run_stages(quiz_filename, html_filename, template, measure):
+  """
+  Runs every stage once, returning {stage: measure(function)}
+  """
+  results = {}
+  quiz, results['parse'] = measure(lambda: quizgen.QuizParser(quiz_filename).parse())
+  # The minidom path
+  dom, results['create_dom_from_quiz'] = measure(lambda: quizgen.create_dom_from_quiz(quiz))
+  _, results['add_dom_to_template'] = measure(
+      lambda: quizgen.add_dom_to_template(dom, html_filename, quiz))
+  # The direct path
+  body, results['render_quiz'] = measure(lambda: quizgen.render_quiz(quiz))
+  _, results['template_render'] = measure(lambda: template.render(quiz.title, body))
+  # Parsing, rendering and writing one problem group at a time
+  _, results['stream'] = measure(
+      lambda: quizgen.compile_quiz(quiz_filename, template, html_file_name=html_filename,
+                                   stream=True))
+  return results
+
+
+def _time(function):
+  gc.collect()
+  start = time.perf_counter()
+  value = function()
+  return value, time.perf_counter() - start
+
+
+def _peak_memory(function):
+  gc.collect()
+  tracemalloc.start()
+  try:
+    value = function()
+    return value, tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+def benchmark(parameters, repeat=5):
+  """
+  Generates a quiz with the given parameters and returns, for every stage, the
+  best and median time over repeat runs and the peak memory
+  """
+  directory = tempfile.mkdtemp(prefix='quizgen-bench-')
+  cwd = os.getcwd()
+  try:
+    os.chdir(directory)
+    with open('bench.quiz', 'w', encoding='utf8') as quiz_file:
+      quiz_file.write(generate_quiz(**parameters))
+    # add_dom_to_template creates quiz.css when it does not exist
+    with open('quiz.css', 'w') as css_file:
+      css_file.write(quizgen.CSS)
+    template = quizgen.Template.load()
+
+    timings = [_run_stages('bench.quiz', 'bench.html', template, _time) for _ in range(repeat)]
+    memory = _run_stages('bench.quiz', 'bench.html', template, _peak_memory)
+    results = {}
+    for name in STAGES:
+      times = sorted(timing[name] for timing in timings)
+      results[name] = {
+        'best': times[0],
+        'median': times[len(times) // 2],
+        'peak_memory': memory[name],
+      }
+    return {
+      'parameters': parameters,
+      'quiz_bytes': os.path.getsize('bench.quiz'),
+      'html_bytes': os.path.getsize('bench.html'),
+      'stages': results,
+    }
+  finally:
+    os.chdir(cwd)
+    shutil.rmtree(directory)
+
+
+def _git_revision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                   stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def _print_results(results, baseline=None):
+  print ('%-8s %-22s %10s %10s %12s %8s' % ('preset', 'stage', 'best (s)', 'median', 'peak (KiB)', 'vs base'))
+  for preset, result in results['benchmarks'].items():
+    for stage, stats in result['stages'].items():
+      ratio = ''
+      try:
+        base = baseline['benchmarks'][preset]['stages'][stage]['median']
+        ratio = '%.2fx' % (stats['median'] / base)
+      except (TypeError, KeyError, ZeroDivisionError):
+        pass
+      print ('%-8s %-22s %10.4f %10.4f %12.1f %8s' % (preset, stage, stats['best'],
+          stats['median'], stats['peak_memory'] / 1024.0, ratio))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Benchmark the stages of quizgen')
+  parser.add_argument('-p', '--preset', action='append', choices=sorted(PRESETS),
+                      help='preset to run (can be repeated, default: all)')
+  parser.add_argument('-r', '--repeat', type=int, default=5)
+  parser.add_argument('-o', '--output', help='write the results to this JSON file')
+  parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+  args = parser.parse_args(argv)
+
+  results = {
+    'revision': _git_revision(),
+    'quizgen_version': quizgen.__version__,
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'benchmarks': {},
+  }
+  for preset in args.preset or sorted(PRESETS):
+    results['benchmarks'][preset] = benchmark(PRESETS[preset], args.repeat)
+
+  baseline = None
+  if args.compare:
+    with open(args.compare, encoding='utf8') as baseline_file:
+      baseline = json.load(baseline_file)
+  _print_results(results, baseline)
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf8') as output:
+      json.dump(results, output, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+  main()
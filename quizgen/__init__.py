@@ -0,0 +1,5301 @@
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+
+# Copyright (c) 2014 Karanveer Mohan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import sys
+import os
+import re
+import itertools
+import io
+import time
+import copy
+
+
+__version__ = '1.3.0'
+
+
+"""
+The parsed quiz. These use __slots__ since a question bank can contain hundreds
+of thousands of options; to_dict() gives the nested dicts used by older code.
+Their __reduce__ pickles them as plain constructor calls, which are smaller and
+faster to load.
+"""
+
+class Option():
+  """An option of a question, with its explanation"""
+  __slots__ = ('description', 'explanation', 'correct')
+
+  def __init__(self, description, explanation='', correct=False):
+    self.description = description
+    self.explanation = explanation
+    self.correct = correct
+
+
+  def __reduce__(self):
+    return (Option, (self.description, self.explanation, self.correct))
+
+
+  def to_dict(self):
+    return {
+      'explanation': self.explanation,
+      'description': self.description,
+      'correct': self.correct
+    }
+
+
+class Question():
+  """A question: its description and its options"""
+  __slots__ = ('description', 'options')
+
+  def __init__(self, description, options=None):
+    self.description = description
+    self.options = options if options is not None else []
+
+
+  def __reduce__(self):
+    return (Question, (self.description, self.options))
+
+
+  def to_dict(self):
+    return {
+      'description': self.description,
+      'options': [option.to_dict() for option in self.options]
+    }
+
+
+class ProblemGroup():
+  """
+  A problem group: an optional title and intro shared by its questions, and the
+  tags and other metadata given after its title
+  """
+  __slots__ = ('title', 'intro', 'questions', 'tags', 'metadata')
+
+  def __init__(self, title, intro='', questions=None, tags=None, metadata=None):
+    self.title = title
+    self.intro = intro
+    self.questions = questions if questions is not None else []
+    self.tags = tags if tags is not None else []
+    self.metadata = metadata if metadata is not None else {}
+
+
+  def __reduce__(self):
+    return (ProblemGroup, (self.title, self.intro, self.questions, self.tags or None,
+                           self.metadata or None))
+
+
+  def to_dict(self):
+    problem_group = {
+      'problem_title': self.title,
+      'problem_intro': self.intro,
+      'questions': [question.to_dict() for question in self.questions]
+    }
+    if self.tags:
+      problem_group['tags'] = self.tags
+    if self.metadata:
+      problem_group['metadata'] = self.metadata
+    return problem_group
+
+
+class Quiz():
+  """A quiz: its title and its problem groups"""
+  __slots__ = ('title', 'problem_groups')
+
+  def __init__(self, title, problem_groups=None):
+    self.title = title
+    self.problem_groups = problem_groups if problem_groups is not None else []
+
+
+  def __reduce__(self):
+    return (Quiz, (self.title, self.problem_groups))
+
+
+  def to_dict(self):
+    return {
+      'title': self.title,
+      'problem_groups': [problem_group.to_dict() for problem_group in self.problem_groups]
+    }
+
+
+"""
+Parse the Quiz to create a Quiz object
+"""
+
+class QuizSyntaxError(Exception):
+  """An error in a quiz, at a given line of its file"""
+  def __init__(self, filename, line_number, message):
+    Exception.__init__(self, '%s:%d: %s' % (filename, line_number, message))
+    self.filename = filename
+    self.line_number = line_number
+    self.message = message
+
+
+  def __reduce__(self):
+    # So that it can be sent back from a worker process
+    return (QuizSyntaxError, (self.filename, self.line_number, self.message))
+
+
+class QuizParser():
+  """Parses the quiz and returns it as a Quiz"""
+  def __init__(self, filename='<string>', rng=None, text=None):
+    if '.quiz' in filename or text is not None:
+      self.filename = filename
+    else:
+      self.filename = '%s.quiz' % filename
+    # When text is given, it is parsed instead of the file, which is then only
+    # a name for error messages
+    self.text = text
+    self.title = None
+    # Random number generator used to shuffle questions and options. When not
+    # given, it is seeded from the contents of the file so that the same quiz
+    # is always shuffled the same way.
+    self.rng = rng
+    self.digest = None
+
+
+  def get_filename(self):
+    return self.filename
+
+
+  def _error(self, line_number, message):
+    """
+    Builds an exception pointing at a line of the quiz file
+    """
+    return QuizSyntaxError(self.filename, line_number, message)
+
+
+  def _iter_lines(self, quizfile):
+    """
+    Yields (line_number, line) for every stripped line of the file, in a single
+    forward pass. Takes care of case where there is an empty line between question
+    and options that existed in EE364A by dropping that empty line.
+    """
+    import hashlib
+    sha1 = hashlib.sha1()
+    pending_blank = None
+    for line_number, line in enumerate(quizfile, 1):
+      sha1.update(line.encode('utf8'))
+      line = line.strip()
+      if pending_blank is not None:
+        if not line.startswith('*'):
+          yield pending_blank
+        pending_blank = None
+      if line:
+        yield line_number, line
+      else:
+        pending_blank = (line_number, line)
+    self.digest = sha1.hexdigest()
+
+
+  def _iter_line_groups(self, lines):
+    """
+    Groups consecutive non blank lines together. Yields (line_numbers, line_group)
+    so that only the group currently being parsed is held in memory.
+    """
+    line_numbers, line_group = [], []
+    for line_number, line in lines:
+      if line:
+        line_numbers.append(line_number)
+        line_group.append(line)
+      elif line_group:
+        yield line_numbers, line_group
+        line_numbers, line_group = [], []
+    if line_group:
+      yield line_numbers, line_group
+
+
+  def _parse_title(self, first_line):
+    """
+    The quiz must begin with a "== " followed by an optional title.
+    If the title exists, it returns the title, empty string otherwise
+    """
+    line_number, first_line = first_line
+    if first_line.startswith('=='):
+      return first_line[2:].lstrip()
+    raise self._error(line_number,
+        'Invalid format. Quiz must start with "==" followed by an optional title.')
+
+
+  def _parse_new_problem_group(self, line_numbers, line_group, start=0):
+    """
+    Parses a new problem group, i.e. the title of the main problem and the statement.
+    Each problem group can have multiple questions associated with it.
+    """
+    title_line = line_group[start]
+    title_end = title_line.rfind(']')
+    if title_end == -1:
+      raise self._error(line_numbers[start],
+          'Problem title must be in the form [TITLE] with the square brackets')
+
+    # [Sensitivity Analysis] tags=duality ==> 'Sensitivity Analysis', ['duality']
+    tags, metadata = self._parse_metadata(title_line[title_end + 1:])
+    return ProblemGroup(title_line[1:title_end],
+                        '\n'.join(itertools.islice(line_group, start + 1, None)),
+                        tags=tags, metadata=metadata)
+
+
+  def _parse_metadata(self, text):
+    """
+    Parses the optional KEY=VALUE pairs after a problem group title, such as
+    [Duality] tags=lagrangian,lp difficulty=2
+    Returns (tags, metadata), metadata holding the pairs other than tags. Other
+    text, such as the (5 pts) of [Problem 1] (5 pts), is ignored as it always was.
+    """
+    tags, metadata = [], {}
+    for item in text.split():
+      key, equals, value = item.partition('=')
+      if not equals or not key:
+        continue
+      if key == 'tags':
+        tags.extend(tag for tag in value.split(',') if tag)
+      else:
+        metadata[key] = value
+    return tags, metadata
+
+
+  def _parse_explanation_and_description(self, line):
+    """
+    Find the description for an option, and an explanation (if any)
+    """
+    if line.find('::') != -1:
+      # We have an explanation for this option
+      explanation = line[line.find('::') + 2:]
+      description = line[line.find(' ') + 1:line.find('::')]
+      has_explanation = True
+    else:
+      explanation = ''
+      description = line[line.find(' ') + 1:]
+      has_explanation = False
+
+    return has_explanation, explanation, description
+
+
+  def _parse_new_question(self, line_numbers, line_group, start=0):
+    """
+    Parses a new question for a given problem group. A question consists of a
+    description and a number of options. A correct option begins with *= and an
+    incorrect option begins with *. An explanation begins with ::
+    """
+    i = start
+    while i < len(line_group) and not line_group[i].startswith('*'):
+      i += 1
+    if i == len(line_group):
+      raise self._error(line_numbers[start], 'ERROR: Options for question not found. '
+          'Perhaps you put a blank line in your problem group?')
+    question = Question(''.join('\n' + line for line in line_group[start:i]))
+
+    # The lines of the text of each option are collected and joined once the
+    # option is complete
+    options = []
+    for line in itertools.islice(line_group, i, None):
+      if line[0] == '*':
+        # New option
+        has_explanation, explanation, description = self._parse_explanation_and_description(line)
+        options.append(([description], [explanation], line.startswith('*=')))
+      else:
+        # Continuation of the description or explanation of the previous option
+        if has_explanation:
+          options[-1][1].append(line)
+        else:
+          has_explanation, explanation, description = self._parse_explanation_and_description(line)
+          options[-1][0].append(description)
+          options[-1][1].append(explanation)
+
+    question.options = [Option('\n'.join(description), '\n'.join(explanation), correct)
+                        for description, explanation, correct in options]
+    return question
+
+
+  def _open(self):
+    if self.text is not None:
+      # Universal newlines, as for a file
+      return io.StringIO(self.text, newline=None)
+    try:
+      return open(self.filename, 'r', encoding='utf8')
+    except IOError:
+      raise Exception('No file named %s found' % self.filename)
+
+
+  def iter_problem_groups(self):
+    """
+    Generator that parses the quiz file in one forward pass and yields every
+    problem group as soon as all of its questions have been read. The quiz title
+    is stored in self.title before the first problem group is yielded.
+    """
+    for line_number, problem_group in self.iter_numbered_problem_groups():
+      yield problem_group
+
+
+  def iter_numbered_problem_groups(self, errors=None):
+    """
+    Same as iter_problem_groups, yielding (line number of the title, problem
+    group). If errors is a list, the syntax errors are added to it instead of
+    being raised, with parsing going on after each one, and questions without
+    a correct option are reported as errors too.
+    """
+    with self._open() as quizfile:
+      lines = self._iter_lines(quizfile)
+      first_line = next(lines, (1, ''))
+      try:
+        self.title = self._parse_title(first_line)
+      except QuizSyntaxError as e:
+        if errors is None:
+          raise
+        errors.append(e)
+        self.title = ''
+        if first_line[1].startswith('['):
+          # The title was left out and this is the first problem group
+          lines = itertools.chain((first_line,), lines)
+
+      for numbered_problem_group in self._iter_numbered_problem_groups_in(lines, errors):
+        yield numbered_problem_group
+
+
+  def _iter_numbered_problem_groups_in(self, lines, errors=None):
+    """
+    Parses the problem groups in (line number, line) pairs that follow the
+    title, see iter_numbered_problem_groups
+    """
+    problem_group = None
+    for line_numbers, line_group in self._iter_line_groups(lines):
+      start = 0
+      if line_group[0].startswith('[') and any(line.startswith('*') for line in line_group):
+        # Grotesque code needed for backwards compatibility
+        # Problem groups need not have intros so a [TITLE] can be immediately followed by
+        # a question. This takes care of that case
+        if problem_group is not None:
+          yield title_line_number, problem_group
+        problem_group = self._parse_problem_group_reporting(line_numbers, line_group[:1], 0,
+                                                            errors)
+        title_line_number = line_numbers[0]
+        start = 1
+
+      if line_group[start].startswith('['):
+        # Marks the beginning of a new problem group
+        if problem_group is not None:
+          yield title_line_number, problem_group
+        problem_group = self._parse_problem_group_reporting(line_numbers, line_group, start,
+                                                            errors)
+        title_line_number = line_numbers[start]
+      else:
+        # This is a single question that corresponds to the last problem_group in the line_group
+        try:
+          question = self._parse_new_question(line_numbers, line_group, start)
+          if problem_group is None:
+            raise self._error(line_numbers[start],
+                'ERROR. Are you sure you started every problem group with "[]"?')
+        except QuizSyntaxError as e:
+          if errors is None:
+            raise
+          errors.append(e)
+          continue
+        if errors is not None and not any(option.correct for option in question.options):
+          errors.append(self._error(line_numbers[start],
+              'Question has no correct option. Mark the correct ones with *='))
+        problem_group.questions.append(question)
+
+    if problem_group is not None:
+      yield title_line_number, problem_group
+
+
+  def _parse_problem_group_reporting(self, line_numbers, line_group, start, errors):
+    """
+    Runs _parse_new_problem_group, adding its error to errors unless errors is
+    None
+    """
+    try:
+      return self._parse_new_problem_group(line_numbers, line_group, start)
+    except QuizSyntaxError as e:
+      if errors is None:
+        raise
+      errors.append(e)
+      # The questions that follow still belong to this (broken) problem group
+      return ProblemGroup('')
+
+
+  def check(self):
+    """
+    Parses the whole file without stopping at the first error and returns
+    every QuizSyntaxError found
+    """
+    errors = []
+    for numbered_problem_group in self.iter_numbered_problem_groups(errors):
+      pass
+    return errors
+
+
+  def read_digest(self):
+    """
+    Hashes the file like _iter_lines does, without parsing it, and returns
+    self.digest
+    """
+    import hashlib
+    sha1 = hashlib.sha1()
+    with self._open() as quizfile:
+      for line in quizfile:
+        sha1.update(line.encode('utf8'))
+    self.digest = sha1.hexdigest()
+    return self.digest
+
+
+  def stream(self, shuffle=True):
+    """
+    Returns a Quiz whose problem_groups is an iterator that parses (and
+    shuffles, as parse would) one problem group at a time, so that a quiz can be
+    written while it is read without ever holding all of it. As the seed is the
+    hash of the whole file, the file is read twice.
+    """
+    import random
+    rng = (self.rng or random.Random(self.read_digest())) if shuffle else None
+    problem_groups = self.iter_problem_groups()
+    # Reading the first problem group also reads the title
+    first = next(problem_groups, None)
+
+    def iter_shuffled(problem_groups):
+      for problem_group in problem_groups:
+        if rng is not None:
+          shuffle_problem_group(problem_group, rng)
+        yield problem_group
+
+    if first is not None:
+      problem_groups = itertools.chain((first,), problem_groups)
+    return Quiz(self.title, iter_shuffled(problem_groups))
+
+
+  def parse(self, shuffle=True):
+    """
+    Parses the whole quiz. The questions and options are shuffled unless
+    shuffle is False, in which case they are in the order of the file.
+    """
+    import random
+    problem_groups = list(self.iter_problem_groups())
+    quiz = Quiz(self.title, problem_groups)
+
+    if shuffle:
+      shuffle_quiz(quiz, self.rng or random.Random(self.digest))
+    return quiz
+
+
+def shuffle_quiz(quiz, rng):
+  """
+  Shuffles, in place, the questions of every problem group and the options of
+  every question using the random number generator rng
+  """
+  for pg in quiz.problem_groups:
+    shuffle_problem_group(pg, rng)
+
+
+def shuffle_problem_group(pg, rng):
+  """
+  Shuffles the questions of a problem group and the options of its questions.
+  Shuffling the problem groups of a quiz one after the other with the same rng
+  is the same as shuffle_quiz.
+  """
+  rng.shuffle(pg.questions)
+  for ql in pg.questions:
+      rng.shuffle(ql.options)
+
+
+"""
+Cache of parsed quizzes. The parsed, unshuffled quiz is pickled in a
+__quizcache__ directory next to the quiz file (or in a given cache directory),
+along with the hash of the file and the version of the parser it was made
+with. Like __pycache__, the cache directory is trusted: only point cache_dir
+at a directory you own.
+"""
+
+# Increase whenever a change to QuizParser changes the quiz it produces
+PARSER_VERSION = 2
+
+QUIZ_CACHE_DIRECTORY = '__quizcache__'
+
+
+def get_cache_filename(quiz_filename, cache_dir=None, extension='.pickle'):
+  """
+  Returns the file where the parsed version of a quiz file is cached (or,
+  with another extension, other data about it)
+  """
+  import hashlib
+  if cache_dir is None:
+    directory, name = os.path.split(quiz_filename)
+    return os.path.join(directory, QUIZ_CACHE_DIRECTORY, name + extension)
+  path_digest = hashlib.sha1(os.path.abspath(quiz_filename).encode('utf8')).hexdigest()
+  return os.path.join(cache_dir, path_digest + extension)
+
+
+def _cache_header(source_digest):
+  return {'parser_version': PARSER_VERSION, 'quizgen_version': __version__,
+          'source_digest': source_digest}
+
+
+def _load_cached_quiz(cache_filename, header):
+  """
+  Returns (quiz, seed) from a cache file if it was made for the same source and
+  parser, None otherwise
+  """
+  import pickle
+  try:
+    with open(cache_filename, 'rb') as cache_file:
+      # The header is read on its own so that a stale quiz is never unpickled
+      if pickle.load(cache_file) != header:
+        return None
+      return pickle.load(cache_file)
+  except Exception:
+    return None
+
+
+def _save_cached_quiz(cache_filename, header, quiz, seed):
+  import pickle
+  try:
+    directory = os.path.dirname(cache_filename) or '.'
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    # The temporary file is removed if pickling fails, e.g. on a full disk
+    with AtomicFile(cache_filename) as cache_file:
+      pickle.dump(header, cache_file, pickle.HIGHEST_PROTOCOL)
+      pickle.dump((quiz, seed), cache_file, pickle.HIGHEST_PROTOCOL)
+  except (IOError, OSError, pickle.PicklingError, TypeError):
+    # The cache is only an optimization, e.g. the directory may be read only or
+    # the metadata of a problem group may hold something that cannot be pickled
+    pass
+
+
+def load_quiz(filename, shuffle=True, cache_dir=None, use_cache=True):
+  """
+  Returns the parsed quiz in a file, loading it from the cache when the cache
+  is up to date and updating the cache otherwise. The quiz is shuffled the same
+  way QuizParser.parse shuffles it, unless shuffle is False.
+  """
+  import random
+  quiz_parser = QuizParser(filename)
+  quiz_filename = quiz_parser.get_filename()
+  quiz, seed = warm(('quiz', os.path.abspath(quiz_filename), cache_dir, use_cache),
+                    [quiz_filename],
+                    lambda: _load_unshuffled_quiz(quiz_parser, cache_dir, use_cache))
+  if shuffle:
+    # The quiz may be kept by the daemon, so a copy is shuffled
+    if warm_cache is not None:
+      quiz = copy.deepcopy(quiz)
+    shuffle_quiz(quiz, random.Random(seed))
+  return quiz
+
+
+def _load_unshuffled_quiz(quiz_parser, cache_dir=None, use_cache=True):
+  """
+  Returns (quiz, seed) for load_quiz, from the cache if it is up to date
+  """
+  quiz_filename = quiz_parser.get_filename()
+  source_digest = file_digest(quiz_filename) if use_cache else None
+  cached = None
+  if source_digest is not None:
+    cache_filename = get_cache_filename(quiz_filename, cache_dir)
+    header = _cache_header(source_digest)
+    cached = _load_cached_quiz(cache_filename, header)
+
+  if cached is not None:
+    quiz, seed = cached
+  else:
+    quiz = quiz_parser.parse(shuffle=False)
+    seed = quiz_parser.digest
+    if source_digest is not None:
+      _save_cached_quiz(cache_filename, header, quiz, seed)
+  return quiz, seed
+
+
+def _new_document():
+  # minidom is slow to import and only needed when rendering through it
+  from xml.dom import minidom
+  return minidom.Document()
+
+
+def create_single_choice_dom_from_option(option):
+  """
+  Creates dom look for a specific option of a question
+  """
+  doc = _new_document()
+
+  li = doc.createElement('li')
+  li.attributes['class'] = 'choice'
+
+  # Each list element has a 'selector', i.e the option that can be selected
+  # and a 'response', i.e the response to be shown when that option is selected
+  selector_div = doc.createElement('div')
+  selector_div.attributes['class'] = 'selection'
+  selector_div.appendChild(doc.createTextNode(option.description))
+
+  response_div = doc.createElement('div')
+  # response_div.attributes['class'] = 'response'
+
+  span = doc.createElement('span')
+  if option.correct:
+    span.attributes['class'] = 'right'
+    response_div.attributes['class'] = 'response right'
+    span.appendChild(doc.createTextNode('Correct! '))
+  else:
+    span.attributes['class'] = 'wrong'
+    response_div.attributes['class'] = 'response wrong'
+    span.appendChild(doc.createTextNode('Incorrect. '))
+  response_div.appendChild(span)
+  response_div.appendChild(doc.createTextNode(option.explanation))
+
+  li.appendChild(selector_div)
+  li.appendChild(response_div)
+
+  return li
+
+
+def create_single_choice_dom_from_question(question):
+  """
+  If a question only has one option correct, creates the dom look for that question
+  """
+  doc = _new_document()
+
+  ol = doc.createElement('ol')
+  ol.attributes['type'] = 'a'
+
+  for option in question.options:
+    elem = create_single_choice_dom_from_option(option)
+    ol.appendChild(elem)
+  return ol
+
+
+def create_multiple_choice_dom_from_option(option):
+  """
+  Creates options with checkboxes for multiple choice responses
+  """
+  doc = _new_document()
+
+  label = doc.createElement('label')
+  checkbox = doc.createElement('input')
+  checkbox.attributes['type'] = 'checkbox'
+
+  # Each list element has a 'selector', i.e the option that can be selected
+  # and a 'response', i.e the response to be shown when that option is selected
+  selector_span = doc.createElement('span')
+  selector_span.attributes['class'] = 'multiple-selection'
+  selector_span.appendChild(doc.createTextNode(option.description))
+
+  # Create nodes to show the checkmark and cross mark when students get options
+  # in an MCQ right/wrong.
+  correct_span = doc.createElement('span')
+  correct_span.attributes['class'] = 'correct-checkbox'
+  correct_span.appendChild(doc.createTextNode('✓'))
+
+  incorrect_span = doc.createElement('span')
+  incorrect_span.attributes['class'] = 'incorrect-checkbox'
+  incorrect_span.appendChild(doc.createTextNode('✗'))
+
+  response_div = doc.createElement('div')
+
+  explanation = ''
+  if option.correct:
+    response_div.attributes['class'] = 'response right'
+    explanation = 'This option is correct. '
+  else:
+    response_div.attributes['class'] = 'response wrong'
+    explanation = 'This option is incorrect. '
+
+
+  response_div.appendChild(doc.createTextNode(explanation + option.explanation))
+
+  label.appendChild(checkbox)
+  label.appendChild(selector_span)
+  label.appendChild(correct_span)
+  label.appendChild(incorrect_span)
+
+  label.appendChild(response_div)
+
+  return label
+
+
+def create_multiple_choice_dom_from_question(question):
+  """
+  If a question only has multiple options correct, creates the dom look for that question.
+  Puts a checkbox next to each option and adds a button allowing you to see the answer
+  """
+  doc = _new_document()
+
+  div = doc.createElement('div')
+  div.attributes['class'] = 'mcq'
+
+  for option in question.options:
+    elem = create_multiple_choice_dom_from_option(option)
+    div.appendChild(elem)
+
+  button = doc.createElement('button')
+  button.appendChild(doc.createTextNode('Submit'))
+  div.appendChild(button)
+
+  return div
+
+
+def create_dom_from_question(question):
+  """
+  Creates dom look for question
+  """
+  doc = _new_document()
+
+  wrapper = doc.createElement('div')
+  div = doc.createElement('div')
+  div.attributes['class'] = 'description'
+  div.appendChild(doc.createTextNode(question.description))
+  wrapper.appendChild(div)
+
+  num_correct = sum(1 for option in question.options if option.correct)
+  if num_correct == 1:
+    el = create_single_choice_dom_from_question(question)
+  else:
+    el = create_multiple_choice_dom_from_question(question)
+
+  wrapper.appendChild(el)
+  return wrapper
+
+
+def create_dom_from_problem_group(problem_group):
+  """
+  Creates the dom look for a problem group
+  """
+  doc = _new_document()
+
+  fieldset = doc.createElement('fieldset')
+
+  if problem_group.title:
+    legend = doc.createElement('legend')
+    legend.appendChild(doc.createTextNode(problem_group.title))
+    fieldset.appendChild(legend)
+
+  if problem_group.intro:
+    div = doc.createElement('div')
+    div.attributes['class'] = 'intro'
+    div.appendChild(doc.createTextNode(problem_group.intro))
+    fieldset.appendChild(div)
+
+  first_question = True
+  for question in problem_group.questions:
+    hr = doc.createElement('hr')
+    if not first_question or problem_group.intro:
+      fieldset.appendChild(hr)
+    first_question = False
+    elem = create_dom_from_question(question)
+    fieldset.appendChild(elem)
+
+  return fieldset
+
+
+def create_dom_from_quiz(quiz):
+  """
+  Given a Quiz, generates its DOM look.
+  """
+  doc = _new_document()
+  wrapper = doc.createElement('div')
+
+  header = doc.createElement('h1')
+  header.appendChild(doc.createTextNode(quiz.title))
+  wrapper.appendChild(header)
+
+  for problem_group in quiz.problem_groups:
+    elem = create_dom_from_problem_group(problem_group)
+    wrapper.appendChild(elem)
+    wrapper.appendChild(doc.createElement('br'))
+
+  return wrapper
+
+
+"""
+Render the quiz straight to HTML. This produces the same markup as the
+create_*dom* functions above without building any minidom nodes; those are
+kept as the reference implementation.
+"""
+
+def escape_html(text):
+  """
+  Escapes text so that it can be written inside an HTML element
+  """
+  return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def escape_attribute(text, escape=escape_html):
+  """
+  Escapes text so that it can be written inside a double quoted attribute
+  """
+  return escape(text).replace('"', '&quot;')
+
+
+"""
+Inline markup. Text in a quiz can contain ||NAME:argument|| markup such as
+||IMG:url||, ||LINK:url|| or ||CODE:language: code||, which is turned into HTML
+while the text fields are rendered.
+"""
+
+MARKUP_HANDLERS = {}
+
+MARKUP_START = re.compile(r'\|\|([A-Z][A-Z0-9_]*):')
+
+
+def markup_handler(name):
+  """
+  Decorator registering a function that renders ||NAME:argument|| markup. The
+  function is called with the argument and the function to use to escape text,
+  and returns HTML, or None if the argument is invalid, in which case the markup
+  is left as it is.
+  """
+  def register(handler):
+    MARKUP_HANDLERS[name] = handler
+    return handler
+  return register
+
+
+@markup_handler('IMG')
+def _render_image(argument, escape):
+  src = argument[1:] if argument[:1].isspace() else argument
+  if not src or any(c.isspace() for c in src):
+    return None
+  return '<div><img src="%s"></div>' % escape_attribute(src, escape)
+
+
+@markup_handler('LINK')
+def _render_link(argument, escape):
+  href = argument[1:] if argument[:1].isspace() else argument
+  if not href or any(c.isspace() for c in href):
+    return None
+  return '<a href="%s">%s</a>' % (escape_attribute(href, escape), escape(href))
+
+
+@markup_handler('CODE')
+def _render_code(argument, escape):
+  language, colon, code = argument.partition(':')
+  if not colon or not language or any(c.isspace() for c in language):
+    return None
+  if code[:1].isspace():
+    code = code[1:]
+  return '<pre><code class="%s">%s</code></pre>' % (escape_attribute(language, escape), escape(code))
+
+
+def expand_markup(text, escape=escape_html):
+  """
+  Escapes text and turns the markup it contains into HTML, in a single pass
+  over the text. Unknown or invalid markup is kept as text.
+  """
+  if '||' not in text:
+    return escape(text)
+
+  pieces = []
+  position = 0
+  match = MARKUP_START.search(text)
+  while match is not None:
+    handler = MARKUP_HANDLERS.get(match.group(1))
+    if handler is None:
+      match = MARKUP_START.search(text, match.start() + 1)
+      continue
+    end = text.find('||', match.end())
+    if end == -1:
+      # No markup after this one can be closed either
+      break
+    html = handler(text[match.end():end], escape)
+    if html is None:
+      match = MARKUP_START.search(text, match.start() + 1)
+      continue
+    pieces.append(escape(text[position:match.start()]))
+    pieces.append(html)
+    position = end + 2
+    match = MARKUP_START.search(text, position)
+  pieces.append(escape(text[position:]))
+  return ''.join(pieces)
+
+
+def _keep_text(text):
+  return text
+
+
+def expand_escaped_markup(html):
+  """
+  Turns the markup in some HTML, whose text is already escaped, into HTML
+  """
+  return expand_markup(html, _keep_text)
+
+
+# Fixed pieces of markup written around the rendered text
+SINGLE_CHOICE_OPEN = '<ol type="a">\n'
+SINGLE_CHOICE_CLOSE = '</ol>\n'
+MULTIPLE_CHOICE_OPEN = '<div class="mcq">\n'
+MULTIPLE_CHOICE_CLOSE = '<button>Submit</button></div>\n'
+QUESTION_CLOSE = '</div>\n'
+QUESTION_SEPARATOR = '<hr/>\n'
+PROBLEM_GROUP_CLOSE = '</fieldset>\n'
+PROBLEM_GROUP_SEPARATOR = '<br/>\n'
+QUIZ_CLOSE = '</div>\n'
+
+
+def single_choice_option_html(option):
+  """
+  Returns the HTML for a specific option of a single choice question
+  """
+  if option.correct:
+    response = '<div class="response right"><span class="right">Correct! </span>'
+  else:
+    response = '<div class="response wrong"><span class="wrong">Incorrect. </span>'
+  return ''.join(('<li class="choice"><div class="selection">',
+                  expand_markup(option.description), '</div>', response,
+                  expand_markup(option.explanation), '</div></li>\n'))
+
+
+def multiple_choice_option_html(option):
+  """
+  Returns the HTML for an option with a checkbox for multiple choice responses
+  """
+  if option.correct:
+    response = '<div class="response right">This option is correct. '
+  else:
+    response = '<div class="response wrong">This option is incorrect. '
+  return ''.join(('<label><input type="checkbox"/><span class="multiple-selection">',
+                  expand_markup(option.description),
+                  '</span><span class="correct-checkbox">✓</span>'
+                  '<span class="incorrect-checkbox">✗</span>', response,
+                  expand_markup(option.explanation), '</div></label>\n'))
+
+
+def write_single_choice_option(option, out):
+  """
+  Writes the HTML for a specific option of a single choice question to out
+  """
+  out.write(single_choice_option_html(option))
+
+
+def write_single_choice_question(question, out):
+  """
+  Writes the list of options of a question that only has one option correct
+  """
+  out.write(SINGLE_CHOICE_OPEN)
+  for option in question.options:
+    write_single_choice_option(option, out)
+  out.write(SINGLE_CHOICE_CLOSE)
+
+
+def write_multiple_choice_option(option, out):
+  """
+  Writes an option with a checkbox for multiple choice responses
+  """
+  out.write(multiple_choice_option_html(option))
+
+
+def write_multiple_choice_question(question, out):
+  """
+  Writes the options of a question that has multiple options correct, followed by
+  the button allowing you to see the answer
+  """
+  out.write(MULTIPLE_CHOICE_OPEN)
+  for option in question.options:
+    write_multiple_choice_option(option, out)
+  out.write(MULTIPLE_CHOICE_CLOSE)
+
+
+def is_single_choice(question):
+  """
+  A question with exactly one correct option is answered by clicking on an
+  option, otherwise students select all the options that apply
+  """
+  return sum(1 for option in question.options if option.correct) == 1
+
+
+def question_head_html(question):
+  """
+  Returns the HTML that comes before the options of a question
+  """
+  return '<div><div class="description">%s</div>\n' % expand_markup(question.description)
+
+
+def write_question(question, out):
+  """
+  Writes the HTML for a question to out
+  """
+  out.write(question_head_html(question))
+  if is_single_choice(question):
+    write_single_choice_question(question, out)
+  else:
+    write_multiple_choice_question(question, out)
+  out.write(QUESTION_CLOSE)
+
+
+def problem_group_head_html(problem_group):
+  """
+  Returns the HTML that comes before the questions of a problem group
+  """
+  head = '<fieldset>\n'
+  if problem_group.title:
+    head += '<legend>%s</legend>\n' % expand_markup(problem_group.title)
+  if problem_group.intro:
+    head += '<div class="intro">%s</div>\n' % expand_markup(problem_group.intro)
+  return head
+
+
+def write_problem_group(problem_group, out):
+  """
+  Writes the HTML for a problem group to out
+  """
+  out.write(problem_group_head_html(problem_group))
+
+  first_question = True
+  for question in problem_group.questions:
+    if not first_question or problem_group.intro:
+      out.write(QUESTION_SEPARATOR)
+    first_question = False
+    write_question(question, out)
+
+  out.write(PROBLEM_GROUP_CLOSE)
+
+
+def quiz_head_html(quiz):
+  """
+  Returns the HTML that comes before the problem groups of a quiz
+  """
+  return '<div>\n<h1>%s</h1>\n' % expand_markup(quiz.title)
+
+
+def write_quiz(quiz, out):
+  """
+  Writes the HTML body of a quiz to out, which can be any object with a write
+  method (an open file, a StringIO, ...)
+  """
+  out.write(quiz_head_html(quiz))
+  write_problem_groups(quiz.problem_groups, out)
+  out.write(QUIZ_CLOSE)
+
+
+def write_problem_groups(problem_groups, out):
+  """
+  Writes the HTML for a sequence of problem groups to out
+  """
+  for problem_group in problem_groups:
+    write_problem_group(problem_group, out)
+    out.write(PROBLEM_GROUP_SEPARATOR)
+
+
+def render_quiz(quiz, reference=False):
+  """
+  Returns the HTML body of a quiz as a string. With reference=True the body is
+  generated through minidom and toprettyxml() instead, which is slower but
+  useful to check the direct renderer against.
+  """
+  if reference:
+    return expand_escaped_markup(create_dom_from_quiz(quiz).toprettyxml())
+  out = io.StringIO()
+  write_quiz(quiz, out)
+  return out.getvalue()
+
+
+def add_dom_to_template(dom, html_file_name, quiz):
+  """
+  Same as add_body_to_template, for a body built with create_dom_from_quiz
+  """
+  add_body_to_template(expand_escaped_markup(dom.toprettyxml()), html_file_name, quiz)
+  create_css()
+
+
+def add_body_to_template(body, html_file_name, quiz, template=None):
+  """
+  Expects a template called 'template.html' with a [BODY] holder where the body
+  will be added and a [TITLE] holder for title. Pass a Template to avoid loading
+  the template files again for every quiz.
+  """
+  template = template or Template.load()
+  write_if_changed(html_file_name, template.render(quiz.title, body))
+
+
+class Template():
+  """
+  A page template that is loaded once and compiled: the header is put in place
+  and the result is split at its [TITLE] and [BODY] holders, with the footer put
+  in the pieces in between. Rendering a page then only joins the pieces.
+  """
+  SLOTS = re.compile(r'(\[TITLE\]|\[BODY\])')
+
+  def __init__(self, template=None, header='', footer=None, minify=False):
+    if template is None:
+      template = HTML
+    if footer is None:
+      footer = DEFAULT_FOOTER
+    # The header and footer may contain IMG and LINK tags (or even CODE), though
+    # they would typically be pure HTML
+    header = expand_escaped_markup(header)
+    footer = expand_escaped_markup(footer)
+    content = template.replace('[HEADER]', header)
+    self.pieces = self.SLOTS.split(content)
+    # Pieces at even positions are text, odd positions are holders. The footer
+    # is added after splitting so that it is used as is.
+    for i in range(0, len(self.pieces), 2):
+      self.pieces[i] = self.pieces[i].replace('[FOOTER]', footer)
+    # When minifying, the template is minified here once and only the body of
+    # each page has to be minified when it is rendered
+    self.minify = minify
+    if minify:
+      self.pieces[::2] = [minify_html(piece) for piece in self.pieces[::2]]
+
+
+  @classmethod
+  def load(cls, minify=False, directory='.'):
+    """
+    Loads 'template.html' (falling back to the default HTML), header.html and
+    footer.html from directory, by default the current directory
+    """
+    return warm(('template', os.path.abspath(directory), minify),
+                [os.path.join(directory, name) for name in TEMPLATE_FILES],
+                lambda: cls._read(minify, directory))
+
+
+  @classmethod
+  def _read(cls, minify, directory):
+    try:
+      template_file = open(os.path.join(directory, 'template.html'))
+      template = template_file.read()
+    except IOError:
+      template = HTML
+    return cls(template, get_header(directory), get_footer(directory), minify)
+
+
+  def render(self, title, body):
+    """
+    Returns the page for a quiz with the given title and HTML body
+    """
+    if self.minify:
+      body = minify_html(body)
+    values = {'[TITLE]': title, '[BODY]': body}
+    return ''.join(piece if i % 2 == 0 else values[piece]
+                   for i, piece in enumerate(self.pieces))
+
+
+  def replace(self, old, new):
+    """
+    Returns a copy of the template with old replaced by new in its text
+    """
+    template = copy.copy(self)
+    template.pieces = [piece.replace(old, new) if i % 2 == 0 else piece
+                       for i, piece in enumerate(self.pieces)]
+    return template
+
+
+  def write(self, out, title, write_body):
+    """
+    Streams the page to out, calling write_body(out) to write the body
+    """
+    if self.minify:
+      # The body has to be minified as a whole
+      buffer = io.StringIO()
+      write_body(buffer)
+      body = minify_html(buffer.getvalue())
+      write_body = lambda out: out.write(body)
+    for i, piece in enumerate(self.pieces):
+      if i % 2 == 0:
+        out.write(piece)
+      elif piece == '[TITLE]':
+        out.write(title)
+      else:
+        write_body(out)
+
+
+"""
+In-memory API. These functions read and write no files and use no global
+state, so a program can call them from several threads at once.
+"""
+
+_default_template = None
+
+
+def get_default_template():
+  """
+  Returns the built-in Template, which unlike Template.load reads no files
+  """
+  global _default_template
+  if _default_template is None:
+    # Two threads may both build it, which is harmless
+    _default_template = Template()
+  return _default_template
+
+
+def parse_quiz(text, rng=None, shuffle=True, name='<string>'):
+  """
+  Parses the text of a quiz. Unless shuffle is False, its questions and
+  options are shuffled with rng, by default a random.Random seeded from the
+  text so that the same text always gives the same quiz. name is used in
+  error messages. An rng must not be shared by threads.
+  """
+  return QuizParser(name, rng, text).parse(shuffle)
+
+
+def render(text, template=None, rng=None, shuffle=True, name='<string>'):
+  """
+  Returns the HTML page of the text of a quiz, made with template (a Template,
+  by default the built-in one). See parse_quiz for the other arguments.
+  """
+  quiz = parse_quiz(text, rng, shuffle, name)
+  return (template or get_default_template()).render(quiz.title, render_quiz(quiz))
+
+
+def read_quiz_file(filename):
+  """
+  Returns the text of a quiz file (filename or filename.quiz)
+  """
+  quiz_parser = QuizParser(filename)
+  with quiz_parser._open() as quiz_file:
+    return quiz_file.read()
+
+
+"""
+Paginated quizzes: the problem groups of a long quiz are split in pages. The
+first page is in the quiz page and the others are HTML fragments next to it,
+which the page fetches (and typesets) only when they are opened.
+"""
+
+PAGINATION_SCRIPT = r"""<script type="text/javascript">
+$(function () {
+  var $pages = $('.quiz-page');
+  var current = 1;
+
+  function show(number) {
+    if (isNaN(number) || number < 1 || number > $pages.length) {
+      return;
+    }
+    current = number;
+    var $page = $pages.eq(number - 1);
+    $pages.hide();
+    $page.show();
+    $('.quiz-pages a').removeClass('current');
+    $('.quiz-pages a[data-page=' + number + ']').addClass('current');
+    var src = $page.attr('data-src');
+    if (src && !$page.data('loaded')) {
+      $page.data('loaded', true);
+      $page.load(src, function (response, status) {
+        if (status == 'error') {
+          $page.data('loaded', false);
+          return;
+        }
+        // Only the fragment that was loaded is set up and typeset
+        $page.find('.response').hide();
+        if (window.hljs) {
+          $page.find('pre code').each(function () { hljs.highlightBlock(this); });
+        }
+        if (window.MathJax) {
+          MathJax.Hub.Queue(['Typeset', MathJax.Hub, $page[0]]);
+        }
+      });
+    }
+  }
+
+  $(document).on('click', '.quiz-pages a', function (event) {
+    event.preventDefault();
+    var page = $(this).attr('data-page');
+    show(page == 'previous' ? current - 1 : page == 'next' ? current + 1 : parseInt(page, 10));
+    if (window.history && history.replaceState) {
+      history.replaceState(null, '', '#page-' + current);
+    }
+    window.scrollTo(0, 0);
+  });
+
+  var match = /^#page-(\d+)$/.exec(location.hash);
+  show(match ? parseInt(match[1], 10) : 1);
+});
+</script>
+"""
+
+
+def paginate(problem_groups, page_size):
+  """
+  Splits problem groups (any iterable) into lists holding at most page_size
+  questions, without splitting a problem group: one with more questions gets
+  a page of its own. Only the page being filled is held.
+  """
+  page, questions = [], 0
+  for problem_group in problem_groups:
+    if page and questions + len(problem_group.questions) > page_size:
+      yield page
+      page, questions = [], 0
+    page.append(problem_group)
+    questions += len(problem_group.questions)
+  if page:
+    yield page
+
+
+def get_page_filename(html_file_name, number):
+  """
+  Returns the name of the fragment holding a page of a quiz: quiz.html gives
+  quiz.page2.html, quiz.page3.html, ...
+  """
+  return '%s.page%d.html' % (html_file_name[:-len('.html')], number)
+
+
+def pagination_html(count):
+  """
+  Returns the links to the pages of a quiz with count pages
+  """
+  links = ['<a href="#page-%d" data-page="%d">%d</a>' % (number, number, number)
+           for number in range(1, count + 1)]
+  return '<div class="quiz-pages">\n%s\n</div>\n' % ' '.join(
+      ['<a href="#" data-page="previous">&laquo;</a>'] + links +
+      ['<a href="#" data-page="next">&raquo;</a>'])
+
+
+def write_paginated_quiz(quiz, html_file_name, page_size, minify=False, compress=False):
+  """
+  Splits a quiz in pages of about page_size questions (see paginate), writes
+  every page but the first to a fragment next to html_file_name (see
+  get_page_filename) as soon as it is complete and returns the body of the
+  quiz page, which holds the first page and loads the others when they are
+  opened. Fragments of an earlier build with more pages are removed.
+  """
+  import glob
+  pages = paginate(quiz.problem_groups, page_size)
+  first_page = io.StringIO()
+  write_problem_groups(next(pages, []), first_page)
+
+  count = 1
+  for count, page in enumerate(pages, 2):
+    out = io.StringIO()
+    write_problem_groups(page, out)
+    fragment = out.getvalue()
+    if minify:
+      fragment = minify_html(fragment)
+    data = fragment.encode('utf8')
+    page_filename = get_page_filename(html_file_name, count)
+    write_if_changed(page_filename, data)
+    update_compressed_copies(page_filename, compress, data)
+
+  stale_pages = re.compile(r'\.page(\d+)\.html(\.gz|\.br)?$')
+  for name in glob.glob(glob.escape(html_file_name[:-len('.html')]) + '.page*.html*'):
+    match = stale_pages.search(name)
+    if match and int(match.group(1)) > count:
+      os.remove(name)
+
+  body = [quiz_head_html(quiz), '<div class="quiz-page" id="page-1">\n', first_page.getvalue(),
+          '</div>\n']
+  if count > 1:
+    body.extend('<div class="quiz-page" id="page-%d" data-src="%s" style="display: none"></div>\n'
+                % (number, escape_attribute(os.path.basename(get_page_filename(html_file_name,
+                                                                              number))))
+                for number in range(2, count + 1))
+    body.append(pagination_html(count))
+    body.append(PAGINATION_SCRIPT)
+  body.append(QUIZ_CLOSE)
+  return ''.join(body)
+
+
+"""
+Minified and compressed output
+"""
+
+# Elements whose contents are kept as they are when minifying
+_PRESERVED_ELEMENTS = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_WHITESPACE = re.compile(r'\s+')
+# Whitespace between two tags, followed by the name of the second tag
+_WHITESPACE_BETWEEN_TAGS = re.compile(r'(</?([!a-zA-Z][a-zA-Z0-9]*)[^<>]*>)\s+(?=</?([!a-zA-Z][a-zA-Z0-9]*))')
+# Whitespace next to these tags is never displayed
+_BLOCK_TAGS = frozenset(('!doctype', 'html', 'head', 'body', 'meta', 'title', 'link', 'script',
+                         'style', 'div', 'p', 'ol', 'ul', 'li', 'fieldset', 'legend', 'hr', 'br',
+                         'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'footer', 'pre'))
+
+
+def _remove_whitespace_between_blocks(match):
+  if match.group(2).lower() in _BLOCK_TAGS or match.group(3).lower() in _BLOCK_TAGS:
+    return match.group(1)
+  return match.group(0)
+
+
+def _collapse_whitespace(match):
+  # A newline is kept because it ends LaTeX % comments
+  return '\n' if '\n' in match.group(0) else ' '
+
+
+def _minify_text(html):
+  html = _WHITESPACE_BETWEEN_TAGS.sub(_remove_whitespace_between_blocks, html)
+  return _WHITESPACE.sub(_collapse_whitespace, html)
+
+
+def _minify_script(script):
+  """
+  Removes the indentation, blank lines and whole-line // comments of a script,
+  keeping line breaks so that statements stay separated
+  """
+  lines = (line.strip() for line in script.split('\n'))
+  return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def minify_html(html):
+  """
+  Returns a compact version of some HTML: whitespace next to block elements is
+  removed and every other run of whitespace becomes a single space or newline,
+  which HTML and LaTeX treat the same way. <pre>, <textarea> and <style>
+  elements are kept as they are, and scripts only lose their indentation and
+  comment lines.
+  """
+  pieces = []
+  position = 0
+  for match in _PRESERVED_ELEMENTS.finditer(html):
+    pieces.append(_minify_text(html[position:match.start()]))
+    element = match.group(0)
+    if match.group(1).lower() == 'script':
+      element = _minify_script(element)
+    pieces.append(element)
+    position = match.end()
+  pieces.append(_minify_text(html[position:]))
+  return ''.join(pieces)
+
+
+def write_compressed_copies(filename, data=None):
+  """
+  Writes filename.gz, and filename.br if the brotli module is installed, next
+  to filename so that a static server can serve them as they are. The gzip
+  header has no timestamp so that the same data always gives the same file.
+  Without data, filename is read and compressed a block at a time.
+  """
+  import gzip
+  import shutil
+  with _open_compression_source(filename, data) as source, AtomicFile(filename + '.gz') as out, \
+      gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9, mtime=0) as gzip_file:
+    shutil.copyfileobj(source, gzip_file)
+  try:
+    import brotli
+  except ImportError:
+    # A copy left by a build that had brotli would be stale
+    _remove_file(filename + '.br')
+    return
+  compressor = brotli.Compressor()
+  with _open_compression_source(filename, data) as source, AtomicFile(filename + '.br') as out:
+    for block in iter(lambda: source.read(1 << 16), b''):
+      out.write(compressor.process(block))
+    out.write(compressor.finish())
+
+
+def _open_compression_source(filename, data):
+  return io.BytesIO(data) if data is not None else open(filename, 'rb')
+
+
+def _remove_file(filename):
+  try:
+    os.remove(filename)
+  except FileNotFoundError:
+    pass
+
+
+def remove_compressed_copies(filename):
+  """
+  Removes the copies of filename written by write_compressed_copies, if any
+  """
+  for extension in ('.gz', '.br'):
+    _remove_file(filename + extension)
+
+
+def update_compressed_copies(filename, compress, data=None):
+  """
+  Writes the compressed copies of filename if compress is True, and otherwise
+  removes those of an earlier build, which a static server that prefers them
+  would serve instead of the new filename
+  """
+  if compress:
+    write_compressed_copies(filename, data)
+  else:
+    remove_compressed_copies(filename)
+
+
+def write_if_changed(filename, content):
+  """
+  Atomically replaces filename with content (a string, or bytes), unless it
+  already holds exactly those bytes. Returns True if the file was written.
+  """
+  data = content.encode('utf8') if isinstance(content, str) else content
+  try:
+    with open(filename, 'rb') as existing_file:
+      if existing_file.read() == data:
+        return False
+  except IOError:
+    pass
+
+  with AtomicFile(filename) as out:
+    out.write(data)
+  return True
+
+
+class AtomicFile():
+  """
+  A file written to a temporary file in the same directory, which is renamed
+  over filename when the with block ends, so readers never see a partially
+  written file. Strings (encoded as UTF-8) and bytes can be written. As with
+  write_if_changed, filename is left untouched if it already holds exactly the
+  bytes that were written, and nothing is replaced if the block raises.
+  """
+  def __init__(self, filename):
+    import tempfile
+    import hashlib
+    self.filename = filename
+    self.changed = False
+    self.sha1 = hashlib.sha1()
+    fd, self.temp_name = tempfile.mkstemp(dir=os.path.dirname(filename) or '.',
+                                          prefix='.quizgen-', suffix='.tmp')
+    self.file = os.fdopen(fd, 'wb')
+
+
+  def write(self, data):
+    if isinstance(data, str):
+      data = data.encode('utf8')
+    self.sha1.update(data)
+    return self.file.write(data)
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, error_type, error, traceback):
+    try:
+      self.file.close()
+      if error_type is None and self.sha1.hexdigest() != file_digest(self.filename):
+        os.chmod(self.temp_name, 0o644)
+        os.replace(self.temp_name, self.filename)
+        self.changed = True
+    finally:
+      if not self.changed:
+        os.unlink(self.temp_name)
+
+
+"""
+Incremental builds
+"""
+
+MANIFEST_FILE = '.quizgen-manifest.json'
+
+
+def file_digest(filename):
+  """
+  Returns the sha1 hex digest of a file's contents, or None if it does not exist
+  """
+  import hashlib
+  sha1 = hashlib.sha1()
+  try:
+    with open(filename, 'rb') as f:
+      for chunk in iter(lambda: f.read(1 << 16), b''):
+        sha1.update(chunk)
+  except IOError:
+    return None
+  return sha1.hexdigest()
+
+
+class BuildManifest():
+  """
+  Remembers, for every generated HTML file, a hash of everything it was built
+  from: the quiz source, template.html, header.html, footer.html and the version
+  of quizgen. A quiz whose hash has not changed does not need to be rebuilt.
+  """
+  def __init__(self, filename=MANIFEST_FILE, options=(), directory='.'):
+    import json
+    self.filename = filename
+    # Where template.html, header.html and footer.html are looked for
+    self.directory = directory
+    # Build options that change the output, such as minify
+    self.options = sorted(options)
+    self.outputs = {}
+    try:
+      with open(filename, encoding='utf8') as manifest_file:
+        manifest = json.load(manifest_file)
+      if manifest.get('version') == __version__:
+        self.outputs = manifest['outputs']
+    except (IOError, ValueError, KeyError):
+      pass
+    self.update_shared_digest()
+
+
+  def update_shared_digest(self):
+    """
+    Hashes the inputs shared by every quiz. Must be called again if the
+    template, header or footer change while the manifest is in use.
+    """
+    self.shared_digest = self._digest(
+        [__version__] + self.options +
+        [file_digest(os.path.join(self.directory, name))
+         for name in ('template.html', 'header.html', 'footer.html')])
+
+
+  def _digest(self, parts):
+    import hashlib
+    return hashlib.sha1('\0'.join(str(part) for part in parts).encode('utf8')).hexdigest()
+
+
+  def key(self, quiz_filename, *extra):
+    """
+    Returns the build key of a quiz file, or None if it can not be read. Any
+    extra inputs of the page (such as the name of its CSS file) are hashed too.
+    """
+    quiz_digest = file_digest(quiz_filename)
+    if quiz_digest is None:
+      return None
+    return self._digest([self.shared_digest, quiz_digest] + list(extra))
+
+
+  def is_fresh(self, html_file_name, key):
+    return key is not None and self.outputs.get(html_file_name) == key and \
+        os.path.exists(html_file_name)
+
+
+  def record(self, html_file_name, key):
+    self.outputs[html_file_name] = key
+
+
+  def save(self):
+    import json
+    write_if_changed(self.filename, json.dumps(
+        {'version': __version__, 'outputs': self.outputs}, indent=1, sort_keys=True))
+
+
+def create_css():
+  """
+  Creates the CSS file if it does not exist. The file is created exclusively so
+  that it is written exactly once even if several processes race to create it.
+  """
+  try:
+    fd = os.open('quiz.css', os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+  except OSError:
+    return
+  print ('No CSS file called quiz.css found in directory. Using default CSS.')
+  with os.fdopen(fd, 'w', encoding='utf8') as generated_css_file:
+    generated_css_file.write(CSS)
+
+
+"""
+Watch mode
+"""
+
+TEMPLATE_FILES = ('template.html', 'header.html', 'footer.html')
+
+
+def expand_quiz_filenames(paths):
+  """
+  Replaces every directory in paths by the .quiz files it contains
+  """
+  import glob
+  filenames = []
+  for path in paths:
+    if os.path.isdir(path):
+      filenames.extend(sorted(glob.glob(os.path.join(path, '*.quiz'))))
+    else:
+      filenames.append(QuizParser(path).get_filename())
+  return filenames
+
+
+def _file_signature(filename):
+  """
+  Returns something that changes whenever the file is modified, or None if
+  the file does not exist
+  """
+  try:
+    stat = os.stat(filename)
+  except OSError:
+    return None
+  return stat.st_mtime_ns, stat.st_size
+
+
+class QuizWatcher():
+  """
+  Polls quiz files (and the directories they are in) for changes and rebuilds
+  only the pages that are affected. Parsed quizzes, their rendered bodies and
+  the template are kept in memory between rebuilds. A change to template.html,
+  header.html or footer.html rebuilds every page. minify and the options of
+  compile_quizzes (compress, stream, page_size, render_cache) give the same
+  pages as a build with them.
+  """
+  def __init__(self, paths, interval=0.5, debounce=0.2, manifest=None, minify=False, **options):
+    self.paths = paths
+    self.interval = interval
+    self.debounce = debounce
+    self.manifest = manifest
+    self.minify = minify
+    self.options = options
+    self.template = None
+    # quiz filename -> (title, rendered body), or None for a page that
+    # compile_quiz wrote as it went (with stream or page_size)
+    self.bodies = {}
+
+
+  def _snapshot(self):
+    filenames = expand_quiz_filenames(self.paths) + list(TEMPLATE_FILES)
+    return dict((filename, _file_signature(filename)) for filename in filenames)
+
+
+  def _wait_until_settled(self, snapshot):
+    """
+    Waits until no file changed during a whole debounce period, so that a burst
+    of edits (or an editor writing a file in several steps) gives one rebuild
+    """
+    while True:
+      time.sleep(self.debounce)
+      settled = self._snapshot()
+      if settled == snapshot:
+        return snapshot
+      snapshot = settled
+
+
+  def _write(self, quiz_filename):
+    if self.bodies[quiz_filename] is None:
+      # Nothing was kept, the page is made again from the file
+      self._rebuild(quiz_filename)
+      return
+    title, body = self.bodies[quiz_filename]
+    html_file_name = get_html_filename(quiz_filename)
+    data = self.template.render(title, body).encode('utf8')
+    if write_if_changed(html_file_name, data):
+      print ('Wrote %s' % html_file_name)
+    if self.options.get('compress'):
+      write_compressed_copies(html_file_name, data)
+    else:
+      remove_compressed_copies(html_file_name)
+    self._record(quiz_filename, html_file_name)
+
+
+  def _record(self, quiz_filename, html_file_name):
+    if self.manifest is not None:
+      self.manifest.record(html_file_name, self.manifest.key(quiz_filename))
+
+
+  def _rebuild(self, quiz_filename):
+    """
+    Parses and renders a quiz again, reporting errors instead of raising them
+    """
+    try:
+      render_cache = self.options.get('render_cache')
+      if self.options.get('stream') or self.options.get('page_size'):
+        html_file_name = compile_quiz(quiz_filename, self.template,
+                                      **dict(self.options, render_cache=None))
+        self.bodies[quiz_filename] = None
+        print ('Wrote %s' % html_file_name)
+        self._record(quiz_filename, html_file_name)
+        return
+      elif render_cache is not None:
+        cache_dir, max_size = render_cache
+        cache = get_render_cache(get_render_cache_filename(quiz_filename, cache_dir), max_size)
+        self.bodies[quiz_filename] = cache.render_quiz(read_quiz_file(quiz_filename),
+                                                       QuizParser(quiz_filename).get_filename())
+        cache.flush()
+      else:
+        quiz = QuizParser(quiz_filename).parse()
+        self.bodies[quiz_filename] = (quiz.title, render_quiz(quiz))
+      self._write(quiz_filename)
+    except Exception as e:
+      self.bodies.pop(quiz_filename, None)
+      sys.stderr.write('%s\n' % e)
+
+
+  def _update(self, changed, snapshot):
+    if self.template is None or any(name in changed for name in TEMPLATE_FILES):
+      self.template = Template.load(self.minify)
+      if self.manifest is not None:
+        self.manifest.update_shared_digest()
+      # Only the template changed for the quizzes we already have in memory
+      for quiz_filename in list(self.bodies):
+        if quiz_filename not in changed:
+          self._write(quiz_filename)
+
+    for quiz_filename in changed:
+      if quiz_filename in TEMPLATE_FILES:
+        continue
+      if snapshot.get(quiz_filename) is None:
+        self.bodies.pop(quiz_filename, None)
+      else:
+        self._rebuild(quiz_filename)
+
+    if self.manifest is not None:
+      self.manifest.save()
+
+
+  def run(self):
+    snapshot = self._snapshot()
+    self._update([name for name in snapshot if name not in TEMPLATE_FILES], snapshot)
+    create_css()
+    print ('Watching for changes. Press Ctrl-C to stop.')
+    while True:
+      time.sleep(self.interval)
+      current = self._snapshot()
+      if current == snapshot:
+        continue
+      current = self._wait_until_settled(current)
+      changed = set(name for name in set(snapshot) | set(current)
+                    if snapshot.get(name) != current.get(name))
+      snapshot = current
+      self._update(changed, snapshot)
+
+
+"""
+Local HTTP server that renders quizzes on request
+"""
+
+class RenderedPage():
+  """A rendered page, with its gzipped version and its entity tag"""
+  __slots__ = ('data', 'gzipped', 'etag')
+
+  def __init__(self, data):
+    import gzip
+    import hashlib
+    self.data = data
+    self.gzipped = gzip.compress(data, 6, mtime=0)
+    self.etag = '"%s"' % hashlib.sha1(data).hexdigest()[:20]
+
+
+class PageCache():
+  """
+  Thread-safe LRU cache of rendered quiz pages, keyed by the path of the quiz
+  file and validated against its modification time and size (and those of the
+  template files). A page that several threads ask for at the same time is
+  rendered only once: the other threads wait for it.
+  """
+  def __init__(self, directory='.', max_pages=128, minify=False):
+    from collections import OrderedDict
+    import threading
+    self.directory = directory
+    self.max_pages = max_pages
+    self.minify = minify
+    self.pages = OrderedDict()
+    self.lock = threading.Lock()
+    # quiz path -> lock held while that quiz is being rendered
+    self.render_locks = {}
+    self.template = None
+    self.template_signature = None
+
+
+  def _get_template(self):
+    signature = tuple(_file_signature(os.path.join(self.directory, name)) for name in TEMPLATE_FILES)
+    with self.lock:
+      if signature != self.template_signature:
+        self.template = Template.load(self.minify, self.directory)
+        self.template_signature = signature
+        self.pages.clear()
+      return self.template, signature
+
+
+  def _cached(self, quiz_path, signature):
+    with self.lock:
+      entry = self.pages.get(quiz_path)
+      if entry is not None and entry[0] == signature:
+        self.pages.move_to_end(quiz_path)
+        return entry[1]
+      return None
+
+
+  def get(self, quiz_path):
+    """
+    Returns the RenderedPage for a quiz file, rendering it if needed
+    """
+    import threading
+    template, template_signature = self._get_template()
+    signature = (_file_signature(quiz_path), template_signature)
+    page = self._cached(quiz_path, signature)
+    if page is not None:
+      return page
+
+    with self.lock:
+      render_lock = self.render_locks.setdefault(quiz_path, threading.Lock())
+    with render_lock:
+      # Another thread may have rendered it while we were waiting
+      page = self._cached(quiz_path, signature)
+      if page is None:
+        page = RenderedPage(render(read_quiz_file(quiz_path), template,
+                                   name=quiz_path).encode('utf8'))
+        with self.lock:
+          self.pages[quiz_path] = (signature, page)
+          self.pages.move_to_end(quiz_path)
+          while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+    return page
+
+
+def _accepts_gzip(accept_encoding):
+  for coding in (accept_encoding or '').split(','):
+    name, _, params = coding.partition(';')
+    if name.strip().lower() in ('gzip', '*'):
+      return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+  return False
+
+
+def make_request_handler(page_cache):
+  """
+  Returns a request handler class serving the directory of page_cache: a
+  request for quiz.html is answered with quiz.quiz rendered in memory, and
+  other files (images, quiz.css, ...) are served as they are.
+  """
+  from http.server import SimpleHTTPRequestHandler
+
+  class QuizRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, **kwargs):
+      super().__init__(*args, directory=page_cache.directory, **kwargs)
+
+
+    def _quiz_path(self):
+      path = self.translate_path(self.path)
+      if os.path.isdir(path):
+        path = os.path.join(path, 'index.html')
+      # The quiz wins over an HTML file that may have been generated from it
+      if path.endswith('.html'):
+        quiz_path = path[:-len('.html')] + '.quiz'
+        if os.path.isfile(quiz_path):
+          return quiz_path
+      return None
+
+
+    def _send_page(self, send_body):
+      quiz_path = self._quiz_path()
+      if quiz_path is None:
+        if self.translate_path(self.path).endswith('quiz.css') and \
+            not os.path.exists(self.translate_path(self.path)):
+          return self._send(CSS.encode('utf8'), 'text/css', None, send_body)
+        return super().do_GET() if send_body else super().do_HEAD()
+
+      try:
+        page = page_cache.get(quiz_path)
+      except Exception as e:
+        self.send_error(500, str(e))
+        return
+      etag = page.etag
+      data = page.data
+      encoding = None
+      if _accepts_gzip(self.headers.get('Accept-Encoding')):
+        etag = etag[:-1] + '-gzip"'
+        data = page.gzipped
+        encoding = 'gzip'
+      if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return
+      self._send(data, 'text/html; charset=utf-8', encoding, send_body, etag)
+
+
+    def _send(self, data, content_type, encoding, send_body, etag=None):
+      self.send_response(200)
+      self.send_header('Content-Type', content_type)
+      self.send_header('Content-Length', str(len(data)))
+      self.send_header('Vary', 'Accept-Encoding')
+      if encoding:
+        self.send_header('Content-Encoding', encoding)
+      if etag:
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+      self.end_headers()
+      if send_body:
+        self.wfile.write(data)
+
+
+    def do_GET(self):
+      self._send_page(True)
+
+
+    def do_HEAD(self):
+      self._send_page(False)
+
+  return QuizRequestHandler
+
+
+def serve(directory='.', host='127.0.0.1', port=8000, threads=8, max_pages=128, minify=False):
+  """
+  Serves the quizzes in directory over HTTP until interrupted. Requests are
+  handled by a pool of threads sharing one PageCache.
+  """
+  from concurrent.futures import ThreadPoolExecutor
+  from http.server import HTTPServer
+
+  class PooledHTTPServer(HTTPServer):
+    def __init__(self, *args, **kwargs):
+      HTTPServer.__init__(self, *args, **kwargs)
+      self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+      self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+      try:
+        self.finish_request(request, client_address)
+      except Exception:
+        self.handle_error(request, client_address)
+      finally:
+        self.shutdown_request(request)
+
+    def server_close(self):
+      HTTPServer.server_close(self)
+      self.pool.shutdown()
+
+  handler = make_request_handler(PageCache(directory, max_pages, minify))
+  server = PooledHTTPServer((host, port), handler)
+  print ('Serving quizzes in %s at http://%s:%d/' % (directory, host, server.server_port))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+
+def serve_main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(prog='quizgen serve')
+  parser.add_argument('directory', nargs='?', default='.')
+  parser.add_argument('-p', '--port', type=int, default=8000)
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--threads', type=int, default=8)
+  parser.add_argument('--cache-size', type=int, default=128, help='number of pages kept in memory')
+  parser.add_argument('--minify', action='store_true')
+  args = parser.parse_args(argv)
+  serve(args.directory, args.host, args.port, args.threads, args.cache_size, args.minify)
+  return 0
+
+
+"""
+Daemon mode: a long running quizgen listening on a Unix socket, which runs the
+commands forwarded by other quizgen invocations with its templates and parsed
+quizzes already loaded, so that they do not pay for starting up every time
+"""
+
+# Overrides the socket of the daemon
+DAEMON_SOCKET_VARIABLE = 'QUIZGEN_SOCKET'
+# Options and commands that are never forwarded to the daemon, as they are
+# quick, interactive or long running
+LOCAL_OPTIONS = ('-h', '--help', '-c', '--create-sample', '-w', '--watch', '--profile',
+                 '--daemon')
+LOCAL_COMMANDS = ('serve',)
+
+# The WarmCache of the daemon, None in other processes
+warm_cache = None
+
+
+class WarmCache():
+  """
+  LRU cache of values computed from files (templates, parsed quizzes), each
+  one kept until one of its files changes
+  """
+  def __init__(self, max_entries=256):
+    from collections import OrderedDict
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+
+
+  def get(self, key, filenames, compute):
+    """
+    Returns the value for key, calling compute() to get it if it is not cached
+    or if one of filenames changed since it was
+    """
+    # Taken before computing, so that a file changed meanwhile is read again
+    signature = tuple(_file_signature(filename) for filename in filenames)
+    entry = self.entries.get(key)
+    if entry is not None and entry[0] == signature:
+      self.entries.move_to_end(key)
+      return entry[1]
+    value = compute()
+    self.entries[key] = (signature, value)
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.max_entries:
+      self.entries.popitem(last=False)
+    return value
+
+
+def warm(key, filenames, compute):
+  """
+  Returns compute(), kept in the WarmCache of the daemon (see WarmCache.get)
+  when running in it
+  """
+  if warm_cache is None:
+    return compute()
+  return warm_cache.get(key, tuple(os.path.abspath(filename) for filename in filenames), compute)
+
+
+def get_daemon_socket():
+  """
+  Returns the path of the socket of the daemon of the current user, or None if
+  Unix sockets are not available
+  """
+  if os.environ.get(DAEMON_SOCKET_VARIABLE):
+    return os.environ[DAEMON_SOCKET_VARIABLE]
+  if os.name != 'posix':
+    return None
+  if os.environ.get('XDG_RUNTIME_DIR'):
+    return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'quizgen-%d.sock' % os.getuid())
+  # The temporary directory is shared, so the socket is put in a directory of
+  # its own that only the user can write to (see is_trusted_socket)
+  directory = os.path.join(os.environ.get('TMPDIR') or '/tmp', 'quizgen-%d' % os.getuid())
+  return os.path.join(directory, 'quizgen.sock')
+
+
+def is_trusted_socket(socket_path):
+  """
+  Whether socket_path is a socket of the current user in a directory where no
+  other user can put a socket of their own in its place: one that only its
+  owner (the user or root) can write to, or a sticky one like /tmp. Commands
+  are only forwarded to such a socket, since the daemon gets their directory
+  and arguments and gives their output and exit status.
+  """
+  import stat
+  try:
+    socket_stat = os.lstat(socket_path)
+    directory_stat = os.stat(os.path.dirname(os.path.abspath(socket_path)))
+  except OSError:
+    return False
+  return (stat.S_ISSOCK(socket_stat.st_mode) and socket_stat.st_uid == os.getuid() and
+          directory_stat.st_uid in (os.getuid(), 0) and
+          (not directory_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH) or
+           bool(directory_stat.st_mode & stat.S_ISVTX)))
+
+
+def is_local_command(argv):
+  """
+  Whether the command given by argv is run by this process rather than
+  forwarded to the daemon. Only options are compared with LOCAL_OPTIONS, so a
+  quiz file named like one of them is forwarded.
+  """
+  if argv[0] in LOCAL_COMMANDS:
+    return True
+  for arg in argv:
+    if arg == '--':
+      break
+    if arg.startswith('-') and arg.split('=', 1)[0] in LOCAL_OPTIONS:
+      return True
+  return False
+
+
+def run_in_daemon(socket_path, argv):
+  """
+  Runs quizgen with argv in the daemon listening on socket_path, in the
+  current directory, copying its output. Returns the exit status, or None if
+  no daemon of this version of quizgen is listening.
+  """
+  import json
+  import socket
+  connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    connection.connect(socket_path)
+  except OSError:
+    connection.close()
+    return None
+  with connection, connection.makefile('rwb') as stream:
+    request = {'version': __version__, 'cwd': os.getcwd(), 'argv': argv}
+    stream.write(json.dumps(request).encode('utf8') + b'\n')
+    stream.flush()
+    for line in stream:
+      message = json.loads(line.decode('utf8'))
+      if 'stdout' in message:
+        sys.stdout.write(message['stdout'])
+      elif 'stderr' in message:
+        sys.stderr.write(message['stderr'])
+      elif 'status' in message:
+        return message['status']
+      else:
+        # Refused, e.g. by a daemon of another version
+        return None
+  sys.stderr.write('The quizgen daemon on %s stopped while running the command\n' % socket_path)
+  return 1
+
+
+class _DaemonOutput(io.TextIOBase):
+  """Sends what is written to it to the client, as stdout or stderr"""
+  def __init__(self, stream, name):
+    self.stream = stream
+    self.name = name
+    self.closed_by_client = False
+
+
+  def writable(self):
+    return True
+
+
+  def write(self, text):
+    import json
+    if not self.closed_by_client:
+      try:
+        self.stream.write(json.dumps({self.name: text}).encode('utf8') + b'\n')
+        self.stream.flush()
+      except OSError:
+        # The client went away; the command still runs to the end
+        self.closed_by_client = True
+    return len(text)
+
+
+def run_daemon(socket_path):
+  """
+  Listens on socket_path until interrupted, running the commands that clients
+  send one at a time, with a WarmCache
+  """
+  import signal
+  import socket
+  import socketserver
+  import traceback
+  global warm_cache
+  warm_cache = WarmCache()
+
+  class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+      import json
+      line = self.rfile.readline()
+      if not line:
+        # Only checking that the daemon is running
+        return
+      request = json.loads(line.decode('utf8'))
+      if request.get('version') != __version__:
+        self.wfile.write(json.dumps({'refused': __version__}).encode('utf8') + b'\n')
+        return
+      # Commands change the directory and the output of the whole process,
+      # which is why they are run one at a time
+      stdout, stderr, directory = sys.stdout, sys.stderr, os.getcwd()
+      sys.stdout = _DaemonOutput(self.wfile, 'stdout')
+      sys.stderr = _DaemonOutput(self.wfile, 'stderr')
+      try:
+        os.chdir(request['cwd'])
+        status = main(request['argv'])
+      except SystemExit as e:
+        # argparse exits on bad arguments
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+      except Exception:
+        traceback.print_exc()
+        status = 1
+      finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        os.chdir(directory)
+      try:
+        self.wfile.write(json.dumps({'status': status or 0}).encode('utf8') + b'\n')
+      except OSError:
+        pass
+
+  os.makedirs(os.path.dirname(os.path.abspath(socket_path)), mode=0o700, exist_ok=True)
+  if os.path.exists(socket_path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      probe.connect(socket_path)
+    except OSError:
+      # Left behind by a daemon that did not stop cleanly
+      os.remove(socket_path)
+    else:
+      raise Exception('A quizgen daemon is already listening on %s' % socket_path)
+    finally:
+      probe.close()
+  # Only the user can connect to the socket
+  umask = os.umask(0o177)
+  try:
+    server = socketserver.UnixStreamServer(socket_path, DaemonRequestHandler)
+  finally:
+    os.umask(umask)
+  print ('quizgen daemon listening on %s' % socket_path)
+  if not is_trusted_socket(socket_path):
+    sys.stderr.write('Other users can write to %s, so commands will not be forwarded '
+                     'to the daemon\n' % os.path.dirname(os.path.abspath(socket_path)))
+
+  def stop(signum, frame):
+    raise KeyboardInterrupt()
+  # Killing the daemon stops it like Ctrl-C does, removing the socket
+  signal.signal(signal.SIGTERM, stop)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    os.remove(socket_path)
+
+
+def usage():
+  print ("""
+  Usage: python quizgen.py [-j N] SOURCE_QUIZ_FILE...
+  You may like to:
+  sudo cp quizgen.py /usr/bin/quizgen
+  so that you can simply type quizgen.
+  Remember to sudo chmod +x /usr/bin/quizgen to make the file executable.
+
+  You can use quizgen simply by typing:
+  quizgen index
+  which will product an index.html from index.quiz file.
+  In case no CSS styling is provided, it will also create a quiz.css file.
+
+  Several quiz files can be given at once. Use -j N to compile them with N
+  worker processes (-j 0 uses one per CPU). An error in one file is reported
+  and the remaining files are still compiled.
+
+  Quizzes whose source, template.html, header.html and footer.html have not
+  changed since the last build are skipped (see .quizgen-manifest.json); use
+  -f to rebuild them anyway. Questions and options are shuffled with a seed
+  derived from the quiz file, so rebuilding a quiz gives the same HTML.
+
+  --minify writes compact HTML, without the indentation of the template and
+  of the inline scripts. --gzip also writes a precompressed quiz.html.gz next
+  to every page (and quiz.html.br if the brotli module is installed), which a
+  static server can send as is.
+
+  --render-cache-size MB keeps up to MB megabytes of rendered problem groups
+  in __quizcache__/fragments.sqlite next to the quizzes (or in --cache-dir
+  DIR), keyed by a hash of their text, so that rebuilding a quiz after
+  changing one problem group, or building a quiz that copies problem groups
+  from another one, only parses and renders the new problem groups. The least
+  recently used problem groups are dropped first.
+
+  For very large quizzes, --stream parses, renders and writes the page one
+  problem group at a time, so that only one problem group is held in memory
+  (the HTML is the same; with --minify the body is still minified as a whole).
+
+  Use --stats to print how long each stage of the build took (parsing,
+  rendering, templating, writing) and the slowest files, --stats-json FILE or
+  --trace FILE to save the same measurements as JSON or as trace events for
+  chrome://tracing, and --profile QUIZ_FILE to compile one file under cProfile.
+
+  --page-size N splits long quizzes in pages of at most N questions (a
+  problem group is never split). The first page is in quiz.html and the
+  others in quiz.page2.html, quiz.page3.html, ... which are only downloaded,
+  and typeset, when a student opens them. The pages have to be served over
+  HTTP for this to work. A custom template.html must bind its click handlers
+  with $(document).on(...) so that they also apply to the pages loaded later.
+
+  To give every student a differently shuffled quiz, use --variants N: for
+  quiz.quiz it writes quiz.v1.html to quiz.vN.html (numbered with leading
+  zeros so that they sort) and an answer key, quiz.variants.json, with the
+  order of the questions and options and the correct letters of each variant.
+  --seed S picks another set of variants. The parsed quiz is cached in a
+  __quizcache__ directory next to it (or in --cache-dir DIR) so that later
+  runs do not parse it again until it changes.
+
+  quizgen grade QUIZ_FILE RESPONSES [--key QUIZ.variants.json] [--partial]
+  grades the responses in a CSV file (a student column, an optional variant
+  column, then the letters picked for each question in the order the page
+  shows them, like b or ad) or a .jsonl file. It writes the score of every
+  student to RESPONSES.scores.csv and how often each option was picked to
+  RESPONSES.histogram.json. --partial gives partial credit to select-all
+  questions; numpy is used when it is installed.
+
+  quizgen check [-j N] [--format json] PATH... parses the quiz files without
+  rendering them and prints every error as FILE:LINE: MESSAGE (or as JSON
+  lines): a missing option, a question without a correct option, a [ without
+  ], a question before the first problem group. It exits with status 1 if it
+  found any.
+
+  quizgen serve DIR [--port 8000] serves the quizzes in DIR over HTTP: asking
+  for quiz.html renders quiz.quiz in memory (again only when it changes), so
+  nothing has to be written to disk.
+
+  quizgen build-site SRC OUT [-j N] [-f] [--minify] [--gzip] [--stream]
+  [--page-size N] [--render-cache-size MB] [--search] compiles every quiz
+  under SRC to the same place under OUT, copies the other files (such as
+  images) and writes an index.html listing the quizzes of every directory that
+  has no index.quiz. The scripts of the template and the quiz.css files are
+  written once to OUT/assets with a hash of their contents in their names, so
+  a web server can let browsers cache them for as long as it likes. --search
+  also writes OUT/search.html, which searches the titles, questions and
+  options of every quiz from the browser, and the index it loads in
+  OUT/search; only the quizzes that changed are indexed again.
+
+  A problem group title can be followed by KEY=VALUE metadata, such as
+  [Duality] tags=duality,lp difficulty=2. quizgen bank index BANK.db PATH...
+  indexes the problem groups of a question bank by tag, difficulty and file,
+  and quizgen bank sample BANK.db TAG=COUNT... -o QUIZ_FILE [--difficulty D]
+  [--seed S] [--html] writes a quiz made of COUNT random problem groups for
+  every TAG. quizgen bank tags BANK.db lists the tags.
+
+  A directory can be given instead of quiz files to compile all the .quiz
+  files it contains. With -w (--watch), quizgen keeps running and rebuilds a
+  page as soon as its quiz file changes; changing template.html, header.html
+  or footer.html rebuilds every page.
+
+  quizgen --daemon [--socket PATH] keeps running and listens on a Unix socket
+  (by default $XDG_RUNTIME_DIR/quizgen-UID.sock, or $QUIZGEN_SOCKET). While it
+  runs, quizgen forwards its commands to it (as long as the socket belongs to
+  the same user and no other user can replace it), which runs them in the same
+  directory with the templates and the quizzes it already parsed kept in
+  memory, so editors and build scripts calling quizgen once per file do not
+  pay for starting up every time. Stop it with Ctrl-C.
+
+  If you want to create sample.quiz to get started, just type:
+  python quizgen.py -c and a file called sample.quiz will be created.
+  This file shows all the features of quizgen along with the format.
+  
+  You may provide a footer and/or header to appear on your quizzes by creating
+  a file named footer.html and/or header.html that contains an html fragment.  
+
+  More information and a lot of sample quizzes file can be found on:
+  https://github.com/karanveerm/quizgen
+  """)
+
+
+def create_sample():
+  try:
+    sample_quiz_file = open('sample.quiz')
+  except IOError:
+    sample_quiz_file = open('sample.quiz', 'w+')
+    sample_quiz_file.write(SAMPLE)
+    sample_quiz_file.close()
+    print ('A file called sample.quiz has been added to your directory.')
+    print ('Please take a look at it to see how to create a quiz.')
+  else:
+    print ('A file called sample.quiz already exists in your current directory!')
+
+# Should a header file exist return the content of that file
+# otherwise return an empty string
+def get_header(directory='.'):
+  try: 
+     header_file = open(os.path.join(directory, 'header.html'))
+  except IOError:
+     header = ''
+  else:
+     header = header_file.read()
+  return header
+  
+# Should a footer file exist return the content of that file
+# otherwise return the standard footer
+def get_footer(directory='.'):
+  try: 
+     footer_file = open(os.path.join(directory, 'footer.html'))
+  except IOError:
+     footer = DEFAULT_FOOTER
+  else:
+     footer = footer_file.read()
+  return footer
+  
+"""
+Per-student variants: a quiz is parsed and rendered once, and each variant only
+reorders the rendered fragments
+"""
+
+def prerender_problem_group(problem_group):
+  """
+  Returns the fragments of a problem group for PrerenderedQuiz: (head, has
+  intro, [(question head and open, [option html], close)])
+  """
+  questions = []
+  for question in problem_group.questions:
+    if is_single_choice(question):
+      option_html, open_html, close_html = single_choice_option_html, SINGLE_CHOICE_OPEN, \
+          SINGLE_CHOICE_CLOSE
+    else:
+      option_html, open_html, close_html = multiple_choice_option_html, MULTIPLE_CHOICE_OPEN, \
+          MULTIPLE_CHOICE_CLOSE
+    questions.append((question_head_html(question) + open_html,
+                      [option_html(option) for option in question.options],
+                      close_html + QUESTION_CLOSE))
+  return problem_group_head_html(problem_group), bool(problem_group.intro), questions
+
+
+class PrerenderedQuiz():
+  """
+  A quiz whose problem groups, questions and options are rendered to HTML once.
+  render() then builds the body for any ordering of the questions and options
+  by joining fragments.
+  """
+  def __init__(self, quiz):
+    self.head = quiz_head_html(quiz)
+    self.problem_groups = [prerender_problem_group(problem_group)
+                           for problem_group in quiz.problem_groups]
+
+
+  def render(self, question_orders, option_orders):
+    """
+    Returns the body of the quiz where the questions of problem group g appear
+    in the order question_orders[g], and the options of question q of problem
+    group g in the order option_orders[g][q]
+    """
+    pieces = [self.head]
+    for (head, has_intro, questions), question_order, option_order in \
+        zip(self.problem_groups, question_orders, option_orders):
+      pieces.append(head)
+      for position, q in enumerate(question_order):
+        if position or has_intro:
+          pieces.append(QUESTION_SEPARATOR)
+        question_head, options, question_close = questions[q]
+        pieces.append(question_head)
+        pieces.extend(options[o] for o in option_order[q])
+        pieces.append(question_close)
+      pieces.append(PROBLEM_GROUP_CLOSE)
+      pieces.append(PROBLEM_GROUP_SEPARATOR)
+    pieces.append(QUIZ_CLOSE)
+    return ''.join(pieces)
+
+
+def _draw_permutations(sizes, count, seed):
+  """
+  Returns count random permutations of range(size) for every size in sizes, as
+  a list (one entry per size) of lists of count permutations. They are drawn
+  with random.Random whether or not numpy is installed, so that a seed always
+  gives the same variants.
+  """
+  import hashlib
+  import random
+  rng = random.Random(int(hashlib.sha1(str(seed).encode('utf8')).hexdigest()[:16], 16))
+  permutations = []
+  for size in sizes:
+    orders = []
+    for _ in range(count):
+      order = list(range(size))
+      rng.shuffle(order)
+      orders.append(order)
+    permutations.append(orders)
+  return permutations
+
+
+def draw_variants(quiz, count, seed):
+  """
+  Draws count orderings of the questions and options of an unshuffled quiz.
+  Returns a list of (question_orders, option_orders) pairs, one per variant,
+  in the format expected by PrerenderedQuiz.render.
+  """
+  sizes = []
+  for problem_group in quiz.problem_groups:
+    sizes.append(len(problem_group.questions))
+    sizes.extend(len(question.options) for question in problem_group.questions)
+  permutations = _draw_permutations(sizes, count, seed)
+
+  variants = []
+  for v in range(count):
+    question_orders, option_orders = [], []
+    i = 0
+    for problem_group in quiz.problem_groups:
+      question_orders.append(permutations[i][v])
+      option_orders.append([permutations[i + 1 + q][v]
+                            for q in range(len(problem_group.questions))])
+      i += 1 + len(problem_group.questions)
+    variants.append((question_orders, option_orders))
+  return variants
+
+
+# Options are answered with the letters a to z
+OPTION_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def check_option_letters(quiz):
+  """
+  Raises an exception if a question of the quiz has more options than there
+  are letters to answer them with
+  """
+  for problem_group in quiz.problem_groups:
+    for question in problem_group.questions:
+      if len(question.options) > len(OPTION_LETTERS):
+        raise Exception('A question has %d options but answers can only use the letters a to z: %s'
+                        % (len(question.options), ' '.join(question.description.split())[:60]))
+
+
+def _answer_key(quiz, question_orders, option_orders):
+  """
+  Returns the correct letters of every question of a variant, in the order
+  the questions are shown, e.g. ['b', 'ad', 'c']
+  """
+  answers = []
+  for problem_group, question_order, option_order in zip(quiz.problem_groups,
+                                                         question_orders, option_orders):
+    for q in question_order:
+      options = problem_group.questions[q].options
+      answers.append(''.join(OPTION_LETTERS[position]
+                             for position, o in enumerate(option_order[q])
+                             if options[o].correct))
+  return answers
+
+
+def get_variant_filename(filename, variant, count):
+  """
+  Returns the name of the HTML file for a variant: quiz.quiz gives quiz.v01.html,
+  quiz.v02.html, ... with as many digits as needed for count variants
+  """
+  return get_html_filename(filename).replace('.html', '.v%0*d.html' % (len(str(count)), variant))
+
+
+def write_variants(filename, count, seed, template=None, cache_dir=None):
+  """
+  Writes count differently shuffled versions of a quiz and an answer key,
+  quiz.variants.json, giving for every variant the order of the questions and
+  options (indices in the quiz file) and the correct letters of each question.
+  Returns the name of the answer key.
+  """
+  import json
+  template = template or Template.load()
+  quiz_parser = QuizParser(filename)
+  quiz = load_quiz(filename, shuffle=False, cache_dir=cache_dir)
+  check_option_letters(quiz)
+  prerendered = PrerenderedQuiz(quiz)
+  variants = draw_variants(quiz, count, seed)
+
+  key = []
+  for v, (question_orders, option_orders) in enumerate(variants, 1):
+    html_file_name = get_variant_filename(quiz_parser.get_filename(), v, count)
+    write_if_changed(html_file_name, template.render(quiz.title,
+                                                     prerendered.render(question_orders, option_orders)))
+    key.append({
+      'file': os.path.basename(html_file_name),
+      'questions': question_orders,
+      'options': option_orders,
+      'answers': _answer_key(quiz, question_orders, option_orders)
+    })
+
+  key_file_name = get_html_filename(quiz_parser.get_filename()).replace('.html', '.variants.json')
+  # One line per variant keeps the key compact but still readable
+  lines = ['{"quiz": %s, "seed": %s, "variants": [' % (
+      json.dumps(quiz_parser.get_filename()), json.dumps(seed))]
+  lines.append(',\n'.join(json.dumps(variant, separators=(',', ':')) for variant in key))
+  lines.append(']}\n')
+  write_if_changed(key_file_name, '\n'.join(lines))
+  return key_file_name
+
+
+"""
+Grading. Students answer the questions in the order their page shows them,
+giving the letters of the options they picked in the order they were shown:
+'b', or 'ad' for a select-all question. Responses are graded in batches, with
+numpy when it is available.
+"""
+
+def get_page_orders(quiz, seed):
+  """
+  Returns the order in which the page of an unshuffled quiz shows its
+  questions and options when shuffled with seed (as in QuizParser.parse), as
+  (question_orders, option_orders) in the format of draw_variants. Shuffling
+  lists of indices makes the same moves as shuffle_quiz makes on the quiz.
+  """
+  return shuffle_orders([[len(question.options) for question in problem_group.questions]
+                         for problem_group in quiz.problem_groups], seed)
+
+
+def shuffle_orders(sizes, seed):
+  """
+  Same as get_page_orders, from the number of options of every question of
+  every problem group
+  """
+  import random
+  rng = random.Random(seed)
+  question_orders, option_orders = [], []
+  for option_counts in sizes:
+    question_order = list(range(len(option_counts)))
+    rng.shuffle(question_order)
+    option_order = [None] * len(question_order)
+    for q in question_order:
+      option_order[q] = list(range(option_counts[q]))
+      rng.shuffle(option_order[q])
+    question_orders.append(question_order)
+    option_orders.append(option_order)
+  return question_orders, option_orders
+
+
+def parse_selection(text):
+  """
+  Returns the options picked in a response as a bit mask: 'b' gives 0b10 and
+  'a, d' gives 0b1001. Anything but letters is ignored.
+  """
+  mask = 0
+  for letter in text.lower():
+    if 'a' <= letter <= 'z':
+      mask |= 1 << (ord(letter) - ord('a'))
+  return mask
+
+
+def read_responses(filename):
+  """
+  Yields (student, variant, answers) for every response in a CSV file or, if
+  its name ends with .jsonl, a JSON lines file. A CSV file has a header row, a
+  student column (or else the first column is the student), an optional
+  variant column, and one column per question in the order they were shown.
+  A JSON line is {"student": ..., "variant": ..., "answers": [...]}, where
+  answers can also be {"q1": ..., "q2": ...}. The variant is None when absent.
+  """
+  import json
+  if filename.endswith('.jsonl'):
+    with open(filename, encoding='utf8') as responses_file:
+      for line in responses_file:
+        if not line.strip():
+          continue
+        response = json.loads(line)
+        answers = response.get('answers', [])
+        if isinstance(answers, dict):
+          answers = [answers.get('q%d' % (i + 1), '') for i in range(
+              max([int(name[1:]) for name in answers if name[1:].isdigit()] or [0]))]
+        yield str(response.get('student', '')), response.get('variant'), \
+            [answer if isinstance(answer, str) else ''.join(answer or '') for answer in answers]
+    return
+
+  import csv
+  with open(filename, encoding='utf8', newline='') as responses_file:
+    reader = csv.reader(responses_file)
+    header = [name.strip().lower() for name in next(reader, [])]
+    student_column = header.index('student') if 'student' in header else 0
+    variant_column = header.index('variant') if 'variant' in header else None
+    answer_columns = [i for i in range(len(header)) if i not in (student_column, variant_column)]
+    for row in reader:
+      if not row:
+        continue
+      row.extend([''] * (len(header) - len(row)))
+      yield row[student_column], row[variant_column] if variant_column is not None else None, \
+          [row[i] for i in answer_columns]
+
+
+class _Memo(dict):
+  """
+  A dict that computes and keeps function(key) for missing keys
+  """
+  def __init__(self, function):
+    self.function = function
+
+
+  def __missing__(self, key):
+    value = self[key] = self.function(key)
+    return value
+
+
+class Grader():
+  """
+  Grades responses to a quiz. A question answered by clicking on an option
+  (is_single_choice) is right when the correct option is picked; a select-all
+  question when exactly the correct options are picked, or with partial=True,
+  it scores the fraction of its options that were rightly picked or left out.
+  Scores and histograms are given per question and option in the order of
+  the quiz file. Without variants, responses are for the quiz page; with the
+  answer key written by write_variants, each response names its variant.
+  """
+  def __init__(self, quiz, page_orders, variants=None, partial=False, use_numpy=None):
+    check_option_letters(quiz)
+    self.quiz = quiz
+    self.partial = partial
+    self.questions = [question for problem_group in quiz.problem_groups
+                      for question in problem_group.questions]
+    self.max_options = max([len(question.options) for question in self.questions] or [1])
+    # Index of the first question of every problem group
+    offsets, offset = [], 0
+    for problem_group in quiz.problem_groups:
+      offsets.append(offset)
+      offset += len(problem_group.questions)
+
+    # A layout is the order of the questions and options of a page. For every
+    # position on the page: the question, its options and the correct mask.
+    self.variant_names = {}
+    orders = [page_orders]
+    if variants is not None:
+      orders = []
+      for v, variant in enumerate(variants):
+        orders.append((variant['questions'], variant['options']))
+        self.variant_names[str(v + 1)] = v
+        self.variant_names[variant['file']] = v
+    self.question_maps, self.option_maps, self.correct_masks = [], [], []
+    for question_orders, option_orders in orders:
+      question_map, option_map, correct_mask = [], [], []
+      for offset, problem_group, question_order, option_order in zip(
+          offsets, quiz.problem_groups, question_orders, option_orders):
+        for q in question_order:
+          options = problem_group.questions[q].options
+          question_map.append(offset + q)
+          option_map.append(option_order[q] + [-1] * (self.max_options - len(option_order[q])))
+          correct_mask.append(sum(1 << position for position, o in enumerate(option_order[q])
+                                  if options[o].correct))
+      self.question_maps.append(question_map)
+      self.option_maps.append(option_map)
+      self.correct_masks.append(correct_mask)
+    self.single = [is_single_choice(question) for question in self.questions]
+    self.option_counts = [len(question.options) for question in self.questions]
+
+    self.histogram = [[0] * len(question.options) for question in self.questions]
+    self.answered = [0] * len(self.questions)
+    self.numpy = None
+    if use_numpy is not False:
+      try:
+        import numpy
+        self.numpy = numpy
+      except ImportError:
+        if use_numpy:
+          raise
+    self.engine = 'numpy' if self.numpy is not None else 'python'
+    # Students give the same few answers over and over
+    self.masks = _Memo(parse_selection)
+
+
+  def _layout(self, variant):
+    if not self.variant_names:
+      return 0
+    try:
+      return self.variant_names[str(variant).strip()]
+    except KeyError:
+      raise Exception('Unknown variant %r' % (variant,))
+
+
+  def grade(self, responses, batch_size=65536):
+    """
+    Grades (student, variant, answers) responses, yielding (student, variant,
+    score, scores of the questions) for each. Responses are graded batch_size
+    at a time, so any number of them can be graded in bounded memory.
+    """
+    grade_batch = self._grade_batch_numpy if self.numpy is not None else self._grade_batch
+    batch = []
+    for response in responses:
+      batch.append(response)
+      if len(batch) == batch_size:
+        for result in grade_batch(batch):
+          yield result
+        batch = []
+    if batch:
+      for result in grade_batch(batch):
+        yield result
+
+
+  def _selections(self, batch):
+    """
+    Returns the layout of every response and its bit masks, one per question
+    """
+    count = len(self.questions)
+    mask = self.masks.__getitem__
+    layouts, selections = [], []
+    for student, variant, answers in batch:
+      layouts.append(self._layout(variant))
+      row = list(map(mask, answers[:count]))
+      if len(row) < count:
+        row.extend([0] * (count - len(row)))
+      selections.append(row)
+    return layouts, selections
+
+
+  def _score(self, question, selected, correct):
+    if not selected:
+      return 0.0
+    if self.single[question] or not self.partial:
+      return 1.0 if selected == correct else 0.0
+    agree = ~(selected ^ correct) & ((1 << self.option_counts[question]) - 1)
+    return bin(agree).count('1') / self.option_counts[question]
+
+
+  def _grade_batch(self, batch):
+    layouts, selections = self._selections(batch)
+    for (student, variant, answers), layout, selected_row in zip(batch, layouts, selections):
+      question_map = self.question_maps[layout]
+      option_map = self.option_maps[layout]
+      correct_mask = self.correct_masks[layout]
+      scores = [0.0] * len(self.questions)
+      for position, selected in enumerate(selected_row):
+        question = question_map[position]
+        scores[question] = self._score(question, selected, correct_mask[position])
+        if selected:
+          self.answered[question] += 1
+          counts = self.histogram[question]
+          for shown, o in enumerate(option_map[position]):
+            if o >= 0 and selected >> shown & 1:
+              counts[o] += 1
+      yield student, variant, sum(scores), scores
+
+
+  def _grade_batch_numpy(self, batch):
+    numpy = self.numpy
+    layouts, selections = self._selections(batch)
+    layouts = numpy.array(layouts, dtype=numpy.intp)
+    selected = numpy.array(selections, dtype=numpy.int64).reshape(len(batch), len(self.questions))
+    question_map = numpy.array(self.question_maps, dtype=numpy.intp)[layouts]
+    option_map = numpy.array(self.option_maps, dtype=numpy.intp).reshape(
+        len(self.question_maps), len(self.questions), self.max_options)[layouts]
+    correct = numpy.array(self.correct_masks, dtype=numpy.int64)[layouts]
+    single = numpy.array(self.single, dtype=bool)[question_map]
+
+    scores = (selected == correct).astype(float)
+    if self.partial:
+      option_counts = numpy.array(self.option_counts, dtype=numpy.int64)[question_map]
+      agree = ~(selected ^ correct) & ((1 << option_counts) - 1)
+      agreeing = sum((agree >> shown) & 1 for shown in range(self.max_options))
+      scores = numpy.where(single, scores, agreeing / option_counts)
+    scores[selected == 0] = 0.0
+
+    # Back to the order of the quiz file
+    file_scores = numpy.zeros_like(scores)
+    numpy.put_along_axis(file_scores, question_map, scores, axis=1)
+
+    count = len(self.questions)
+    answered = numpy.bincount(question_map[selected != 0], minlength=count)
+    histogram = numpy.zeros(count * self.max_options, dtype=numpy.int64)
+    for shown in range(self.max_options):
+      picked = ((selected >> shown) & 1).astype(bool) & (option_map[:, :, shown] >= 0)
+      histogram += numpy.bincount(
+          (question_map * self.max_options + option_map[:, :, shown])[picked],
+          minlength=count * self.max_options)
+    histogram = histogram.reshape(count, self.max_options).tolist()
+    for question, counts in enumerate(self.histogram):
+      self.answered[question] += int(answered[question])
+      for o in range(len(counts)):
+        counts[o] += histogram[question][o]
+
+    totals = file_scores.sum(axis=1).tolist()
+    for (student, variant, answers), total, question_scores in zip(batch, totals,
+                                                                   file_scores.tolist()):
+      yield student, variant, total, question_scores
+
+
+  def histogram_json(self):
+    """
+    Returns, for every question in the order of the quiz file, how many
+    responses answered it and picked each of its options
+    """
+    result = []
+    questions = iter(zip(self.questions, self.answered, self.histogram))
+    for problem_group in self.quiz.problem_groups:
+      for _ in problem_group.questions:
+        question, answered, counts = next(questions)
+        result.append({
+          'question': len(result) + 1,
+          'problem_group': problem_group.title,
+          'description': question.description.strip(),
+          'select_all': not is_single_choice(question),
+          'answered': answered,
+          'options': [{'description': option.description, 'correct': option.correct,
+                       'count': count}
+                      for option, count in zip(question.options, counts)]
+        })
+    return result
+
+
+def grade_responses(quiz_filename, responses_filename, scores_filename, histogram_filename,
+                    key_filename=None, partial=False, batch_size=65536, use_numpy=None):
+  """
+  Grades the responses in responses_filename (see read_responses) to a quiz,
+  writing one row per student to the CSV file scores_filename (student,
+  variant, score, out of, then the score of every question in the order of
+  the quiz file) and the option histograms to the JSON file
+  histogram_filename. key_filename is the answer key of --variants the
+  responses are for. Returns (number of responses, mean score, engine).
+  """
+  import csv
+  import json
+  quiz = load_quiz(quiz_filename, shuffle=False)
+  variants = None
+  if key_filename:
+    with open(key_filename, encoding='utf8') as key_file:
+      variants = json.load(key_file)['variants']
+  grader = Grader(quiz, get_page_orders(quiz, QuizParser(quiz_filename).read_digest()), variants,
+                  partial, use_numpy)
+
+  count, total = 0, 0.0
+  score_text = _Memo(lambda score: '%g' % score)
+  with AtomicFile(scores_filename) as scores_file:
+    writer = csv.writer(scores_file, lineterminator='\n')
+    writer.writerow(['student', 'variant', 'score', 'out_of'] +
+                    ['q%d' % (i + 1) for i in range(len(grader.questions))])
+    for student, variant, score, scores in grader.grade(read_responses(responses_filename),
+                                                        batch_size):
+      writer.writerow([student, '' if variant is None else variant, score_text[score],
+                       len(grader.questions)] + list(map(score_text.__getitem__, scores)))
+      count += 1
+      total += score
+  write_if_changed(histogram_filename, json.dumps(grader.histogram_json(), indent=1) + '\n')
+  return count, total / count if count else 0.0, grader.engine
+
+
+def grade_main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(prog='quizgen grade')
+  parser.add_argument('quiz')
+  parser.add_argument('responses')
+  parser.add_argument('-o', '--output', help='scores CSV (default: RESPONSES.scores.csv)')
+  parser.add_argument('--histogram', help='histogram JSON (default: RESPONSES.histogram.json)')
+  parser.add_argument('--key', help='answer key of --variants the responses are for')
+  parser.add_argument('--partial', action='store_true',
+                      help='give partial credit to select-all questions')
+  parser.add_argument('--batch-size', type=int, default=65536)
+  args = parser.parse_args(argv)
+  base = os.path.splitext(args.responses)[0]
+  try:
+    count, mean, engine = grade_responses(
+        args.quiz, args.responses, args.output or base + '.scores.csv',
+        args.histogram or base + '.histogram.json', args.key, args.partial, args.batch_size)
+  except Exception as e:
+    sys.stderr.write('%s\n' % e)
+    return 1
+  print ('Graded %d responses (mean score %.2f, %s)' % (count, mean, engine))
+  return 0
+
+
+"""
+Question banks: an index of the problem groups of many quiz files, by tag,
+difficulty and file, kept in an SQLite database. The index records where each
+problem group is in its file, so that a quiz can be assembled from a sample of
+problem groups by copying their source, without parsing the bank again.
+"""
+
+BANK_VERSION = 1
+
+BANK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+  id INTEGER PRIMARY KEY,
+  path TEXT UNIQUE NOT NULL,
+  signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS groups (
+  id INTEGER PRIMARY KEY,
+  file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+  start INTEGER NOT NULL,
+  length INTEGER NOT NULL,
+  line INTEGER NOT NULL,
+  title TEXT NOT NULL,
+  difficulty NUMERIC,
+  questions INTEGER NOT NULL,
+  metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+  tag TEXT NOT NULL,
+  group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS tags_by_tag ON tags (tag, group_id);
+CREATE INDEX IF NOT EXISTS tags_by_group ON tags (group_id);
+CREATE INDEX IF NOT EXISTS groups_by_file ON groups (file_id);
+CREATE INDEX IF NOT EXISTS groups_by_difficulty ON groups (difficulty);
+"""
+
+
+def _line_offsets(filename, line_numbers):
+  """
+  Returns the byte offset of the start of each of the given (increasing) line
+  numbers of a file, and the size of the file
+  """
+  offsets = []
+  wanted = iter(line_numbers)
+  next_line = next(wanted, None)
+  offset = 0
+  with open(filename, 'rb') as quiz_file:
+    for line_number, line in enumerate(quiz_file, 1):
+      if line_number == next_line:
+        offsets.append(offset)
+        next_line = next(wanted, None)
+      offset += len(line)
+  return offsets, offset
+
+
+class QuestionBank():
+  """
+  An index of the problem groups of a set of quiz files. The paths of the files
+  are stored relative to the index, so a bank can be moved with its index.
+  """
+  def __init__(self, filename):
+    import sqlite3
+    self.filename = filename
+    self.directory = os.path.dirname(os.path.abspath(filename))
+    self.connection = sqlite3.connect(filename)
+    self.connection.execute('PRAGMA foreign_keys = ON')
+    version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+    if version not in (0, BANK_VERSION):
+      raise Exception('%s was made by another version of quizgen, delete it to rebuild it' %
+                      filename)
+    self.connection.executescript(BANK_SCHEMA)
+    self.connection.execute('PRAGMA user_version = %d' % BANK_VERSION)
+
+
+  def close(self):
+    self.connection.close()
+
+
+  def _path(self, filename):
+    return os.path.relpath(os.path.abspath(filename), self.directory)
+
+
+  def update(self, paths):
+    """
+    Indexes the quiz files given (directories stand for the .quiz files in
+    them) that are new or changed since they were last indexed, and forgets
+    indexed files that no longer exist. Returns (number of files indexed,
+    errors), a file with errors being left out of the index.
+    """
+    import json
+    indexed, errors = 0, []
+    with self.connection:
+      for path, in self.connection.execute('SELECT path FROM files').fetchall():
+        if not os.path.exists(os.path.join(self.directory, path)):
+          self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+      for filename in expand_quiz_filenames(paths):
+        filename = QuizParser(filename).get_filename()
+        signature = json.dumps(_file_signature(filename))
+        row = self.connection.execute('SELECT signature FROM files WHERE path = ?',
+                                      (self._path(filename),)).fetchone()
+        if row is not None and row[0] == signature:
+          continue
+        try:
+          self._index_file(filename, signature)
+          indexed += 1
+        except Exception as e:
+          self.connection.execute('DELETE FROM files WHERE path = ?', (self._path(filename),))
+          errors.append(str(e))
+    return indexed, errors
+
+
+  def _index_file(self, filename, signature):
+    import json
+    numbered_problem_groups = list(QuizParser(filename).iter_numbered_problem_groups())
+    line_numbers = [line_number for line_number, problem_group in numbered_problem_groups]
+    offsets, size = _line_offsets(filename, line_numbers)
+    ends = offsets[1:] + [size]
+
+    self.connection.execute('DELETE FROM files WHERE path = ?', (self._path(filename),))
+    file_id = self.connection.execute('INSERT INTO files (path, signature) VALUES (?, ?)',
+                                      (self._path(filename), signature)).lastrowid
+    for (line_number, problem_group), start, end in zip(numbered_problem_groups, offsets, ends):
+      metadata = dict(problem_group.metadata)
+      difficulty = metadata.pop('difficulty', None)
+      group_id = self.connection.execute(
+          'INSERT INTO groups (file_id, start, length, line, title, difficulty, questions, '
+          'metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+          (file_id, start, end - start, line_number, problem_group.title, difficulty,
+           len(problem_group.questions), json.dumps(metadata, sort_keys=True))).lastrowid
+      self.connection.executemany('INSERT INTO tags (tag, group_id) VALUES (?, ?)',
+                                  [(tag, group_id) for tag in set(problem_group.tags)])
+
+
+  def tags(self):
+    """
+    Returns [(tag, number of problem groups)] for every tag of the bank
+    """
+    return self.connection.execute(
+        'SELECT tag, COUNT(*) FROM tags GROUP BY tag ORDER BY tag').fetchall()
+
+
+  def _candidates(self, tag, difficulties, files):
+    query = 'SELECT tags.group_id FROM tags JOIN groups ON groups.id = tags.group_id'
+    conditions, parameters = ['tags.tag = ?'], [tag]
+    if difficulties:
+      conditions.append('groups.difficulty IN (%s)' % ', '.join('?' * len(difficulties)))
+      parameters.extend(difficulties)
+    if files:
+      query += ' JOIN files ON files.id = groups.file_id'
+      conditions.append('files.path IN (%s)' % ', '.join('?' * len(files)))
+      parameters.extend(self._path(filename) for filename in files)
+    query += ' WHERE %s ORDER BY tags.group_id' % ' AND '.join(conditions)
+    return [group_id for group_id, in self.connection.execute(query, parameters)]
+
+
+  def sample(self, counts, difficulties=None, files=None, seed=None):
+    """
+    Picks counts[tag] problem groups at random for every tag, never picking the
+    same problem group twice, optionally only among the problem groups of the
+    given difficulties and files. Only the index is read. Returns the ids of
+    the problem groups.
+    """
+    import random
+    rng = random.Random(seed)
+    chosen = []
+    taken = set()
+    for tag, count in counts:
+      candidates = [group_id for group_id in self._candidates(tag, difficulties, files)
+                    if group_id not in taken]
+      if len(candidates) < count:
+        raise Exception('Only %d problem groups tagged %s are left, %d were asked for' %
+                        (len(candidates), tag, count))
+      picked = rng.sample(candidates, count)
+      chosen.extend(picked)
+      taken.update(picked)
+    return chosen
+
+
+  def read_sources(self, group_ids):
+    """
+    Yields the source of every problem group, read from its quiz file
+    """
+    rows = {}
+    for start in range(0, len(group_ids), 500):
+      batch = group_ids[start:start + 500]
+      rows.update((row[0], row[1:]) for row in self.connection.execute(
+          'SELECT groups.id, files.path, groups.start, groups.length FROM groups '
+          'JOIN files ON files.id = groups.file_id WHERE groups.id IN (%s)' %
+          ', '.join('?' * len(batch)), batch))
+    for group_id in group_ids:
+      path, start, length = rows[group_id]
+      with open(os.path.join(self.directory, path), 'rb') as quiz_file:
+        quiz_file.seek(start)
+        yield quiz_file.read(length).decode('utf8')
+
+
+  def write_quiz(self, out, title, group_ids):
+    """
+    Writes a quiz made of the given problem groups to out
+    """
+    out.write('== %s\n\n' % title)
+    for source in self.read_sources(group_ids):
+      # Problem groups must be separated by a blank line
+      out.write(source.rstrip() + '\n\n')
+
+
+def _parse_tag_count(text):
+  import argparse
+  tag, _, count = text.rpartition('=')
+  if not tag or not count.isdigit():
+    raise argparse.ArgumentTypeError('expected TAG=COUNT, got %r' % text)
+  return tag, int(count)
+
+
+def bank_main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(prog='quizgen bank')
+  commands = parser.add_subparsers(dest='command')
+  commands.required = True
+  index_parser = commands.add_parser('index', help='index (or update the index of) quiz files')
+  index_parser.add_argument('bank')
+  index_parser.add_argument('paths', nargs='+')
+  tags_parser = commands.add_parser('tags', help='list the tags of a bank')
+  tags_parser.add_argument('bank')
+  sample_parser = commands.add_parser('sample', help='make a quiz from a sample of a bank')
+  sample_parser.add_argument('bank')
+  sample_parser.add_argument('counts', nargs='+', type=_parse_tag_count, metavar='TAG=COUNT')
+  sample_parser.add_argument('-o', '--output', required=True)
+  sample_parser.add_argument('--title', default='Quiz')
+  sample_parser.add_argument('--difficulty', action='append')
+  sample_parser.add_argument('--file', action='append')
+  sample_parser.add_argument('--seed')
+  sample_parser.add_argument('--html', action='store_true', help='also compile the quiz')
+  args = parser.parse_args(argv)
+
+  bank = QuestionBank(args.bank)
+  try:
+    if args.command == 'index':
+      indexed, errors = bank.update(args.paths)
+      for error in errors:
+        sys.stderr.write(error + '\n')
+      print ('Indexed %d files' % indexed)
+      return 1 if errors else 0
+    if args.command == 'tags':
+      for tag, count in bank.tags():
+        print ('%s\t%d' % (tag, count))
+      return 0
+
+    group_ids = bank.sample(args.counts, args.difficulty, args.file, args.seed)
+    with AtomicFile(args.output) as out:
+      bank.write_quiz(out, args.title, group_ids)
+  except Exception as e:
+    sys.stderr.write('%s\n' % e)
+    return 1
+  finally:
+    bank.close()
+  if args.html:
+    print ('Wrote %s' % compile_quiz(args.output))
+    create_css()
+  return 0
+
+
+"""
+Huge quiz files: the file is memory-mapped and the byte offset of every problem
+group is kept in an index next to it, so that a few problem groups can be
+parsed without reading the rest of the file
+"""
+
+OFFSET_INDEX_VERSION = 2
+
+# A line starting with [ that follows a line break, a blank line and a line
+# break, taking the bytes of other characters than ASCII as whitespace as they
+# may be. Lines that do start a problem group are then picked out as the parser
+# would, stripping them. Starting with \n is much faster, and only files with
+# lines ending in a lone \r need the other one.
+_PROBLEM_GROUP_CANDIDATE = re.compile(
+    br'\n[\t\v\f\x1c-\x1f \x80-\xff]*\r?\n([\t\v\f\x1c-\x1f \x80-\xff]*)\[')
+_UNIVERSAL_PROBLEM_GROUP_CANDIDATE = re.compile(
+    br'[\r\n][\t\v\f\x1c-\x1f \x80-\xff]*(?:\r\n?|\n)([\t\v\f\x1c-\x1f \x80-\xff]*)\[')
+
+_LINE_BREAK = re.compile(br'\r\n?|\n')
+_LONE_CARRIAGE_RETURN = re.compile(br'\r(?!\n)')
+
+
+def _line_at(data, start):
+  """
+  Returns the line starting at start, stripped, and the start of the next line
+  """
+  match = _LINE_BREAK.search(data, start)
+  end, next_start = (match.start(), match.end()) if match else (len(data), len(data))
+  return data[start:end].decode('utf8').strip(), next_start
+
+
+def _line_before(data, start):
+  """
+  Returns the line before the one starting at start, stripped
+  """
+  end = start - 2 if start >= 2 and data[start - 2:start] == b'\r\n' else start - 1
+  line_start = data.rfind(b'\n', 0, end) + 1
+  line_start = data.rfind(b'\r', line_start, end) + 1 or line_start
+  return data[line_start:end].decode('utf8').strip()
+
+
+def find_problem_groups(data):
+  """
+  Returns arrays of the byte offsets and of the line numbers where the chunks
+  of a quiz start, from its bytes (or a memory map of them). The file is split
+  where QuizParser splits problem groups: at a line starting with [ that
+  follows a blank line or the title, the lines being stripped as the parser
+  strips them. Each chunk can be parsed on its own with
+  parse_problem_group_chunk; it holds one problem group, or two when the title
+  of the second immediately follows the first.
+  """
+  from array import array
+  offsets, line_numbers = array('q'), array('q')
+  # The first problem group may directly follow the title
+  title, second_line = _line_at(data, 0)
+  if _line_at(data, second_line)[0].startswith('['):
+    offsets.append(second_line)
+    line_numbers.append(2)
+  universal = _LONE_CARRIAGE_RETURN.search(data) is not None
+  candidates = _UNIVERSAL_PROBLEM_GROUP_CANDIDATE if universal else _PROBLEM_GROUP_CANDIDATE
+  offset, line_number = 0, 1
+  for match in candidates.finditer(data):
+    start = match.start(1)
+    if data[start:match.end(1)].decode('utf8').strip() or _line_before(data, start):
+      continue
+    # Lines are counted a stretch at a time
+    stretch = data[offset:start]
+    line_number += stretch.count(b'\n')
+    if universal:
+      line_number += stretch.count(b'\r') - stretch.count(b'\r\n')
+    offset = start
+    offsets.append(offset)
+    line_numbers.append(line_number)
+  return offsets, line_numbers
+
+
+def parse_problem_group_chunk(filename, source, first_line_number):
+  """
+  Returns the list of problem groups parsed from the text of a chunk found by
+  find_problem_groups, that starts at first_line_number of filename (for error
+  messages)
+  """
+  quiz_parser = QuizParser(filename, text=source)
+  lines = ((first_line_number + line_number - 1, line) for line_number, line in
+           quiz_parser._iter_lines(io.StringIO(source, newline=None)))
+  return [problem_group for line_number, problem_group in
+          quiz_parser._iter_numbered_problem_groups_in(lines)]
+
+
+class MappedQuiz():
+  """
+  A memory-mapped quiz file whose problem groups are parsed one at a time, on
+  demand: mapped_quiz[i] is the i-th problem group (not shuffled). The offsets
+  of the problem groups are found with a single scan of the file the first
+  time, and kept in __quizcache__ (or cache_dir) until the file changes.
+  Questions written before the first problem group are not seen.
+
+  A chunk of the file that holds several problem groups (see
+  find_problem_groups) has its offset repeated once for each of them.
+  """
+  def __init__(self, filename, cache_dir=None):
+    import mmap
+    self.filename = QuizParser(filename).get_filename()
+    self.file = open(self.filename, 'rb')
+    try:
+      size = os.fstat(self.file.fileno()).st_size
+      # An empty file cannot be mapped
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+      first_line = _line_at(self.map, 0)[0]
+      self.title = QuizParser(self.filename)._parse_title((1, first_line))
+      self.index_filename = get_cache_filename(self.filename, cache_dir, '.offsets')
+      self.offsets, self.line_numbers = self._load_index() or self._build_index()
+    except Exception:
+      self.close()
+      raise
+
+
+  def close(self):
+    if hasattr(self.map, 'close'):
+      self.map.close()
+    self.file.close()
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+
+  def __len__(self):
+    return len(self.offsets)
+
+
+  def _signature(self):
+    return list(_file_signature(self.filename))
+
+
+  def _load_index(self):
+    import json
+    from array import array
+    try:
+      with open(self.index_filename, 'rb') as index_file:
+        header = json.loads(index_file.readline().decode('utf8'))
+        if header.get('version') != OFFSET_INDEX_VERSION or \
+            header.get('signature') != self._signature():
+          return None
+        offsets, line_numbers = array('q'), array('q')
+        offsets.fromfile(index_file, header['count'])
+        line_numbers.fromfile(index_file, header['count'])
+        return offsets, line_numbers
+    except (IOError, OSError, ValueError, EOFError):
+      return None
+
+
+  def _build_index(self):
+    """
+    Finds the offset and line number of every problem group and saves them
+    """
+    import json
+    from array import array
+    offsets, line_numbers = array('q'), array('q')
+    chunk_offsets, chunk_line_numbers = find_problem_groups(self.map)
+    for chunk, (offset, line_number) in enumerate(zip(chunk_offsets, chunk_line_numbers)):
+      count = 1
+      if _line_at(self.map, _line_at(self.map, offset)[1])[0].startswith('['):
+        # Only a title right after the first one starts a second problem group
+        end = chunk_offsets[chunk + 1] if chunk + 1 < len(chunk_offsets) else len(self.map)
+        count = len(parse_problem_group_chunk(self.filename,
+                                              self.map[offset:end].decode('utf8'), line_number))
+      offsets.extend([offset] * count)
+      line_numbers.extend([line_number] * count)
+    header = {'version': OFFSET_INDEX_VERSION, 'signature': self._signature(),
+              'count': len(offsets)}
+    try:
+      directory = os.path.dirname(self.index_filename)
+      if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+      with AtomicFile(self.index_filename) as index_file:
+        index_file.write(json.dumps(header) + '\n')
+        index_file.write(offsets.tobytes())
+        index_file.write(line_numbers.tobytes())
+    except (IOError, OSError):
+      # The index is only an optimization, e.g. the directory may be read only
+      pass
+    return offsets, line_numbers
+
+
+  def _position(self, index):
+    """
+    Returns the position of the index-th problem group, counting from the end
+    for negative indices as lists do, or raises IndexError
+    """
+    position = index + len(self.offsets) if index < 0 else index
+    if not 0 <= position < len(self.offsets):
+      raise IndexError('%s has no problem group %d' % (self.filename, index))
+    return position
+
+
+  def source(self, index):
+    """
+    Returns the text of the chunk that holds the index-th problem group, as in
+    the file
+    """
+    import bisect
+    index = self._position(index)
+    start = self.offsets[index]
+    end = bisect.bisect_right(self.offsets, start)
+    end = self.offsets[end] if end < len(self.offsets) else len(self.map)
+    return self.map[start:end].decode('utf8')
+
+
+  def __getitem__(self, index):
+    import bisect
+    index = self._position(index)
+    problem_groups = parse_problem_group_chunk(self.filename, self.source(index),
+                                               self.line_numbers[index])
+    # The problem groups of a chunk share its offset
+    first = bisect.bisect_left(self.offsets, self.offsets[index])
+    if len(problem_groups) != bisect.bisect_right(self.offsets, self.offsets[index]) - first:
+      raise Exception('%s changed while it was read' % self.filename)
+    return problem_groups[index - first]
+
+
+  def __iter__(self):
+    for index in range(len(self)):
+      yield self[index]
+
+
+  def read_quiz(self, indices, rng=None):
+    """
+    Returns a Quiz made of the problem groups at the given indices, shuffled
+    with rng if one is given
+    """
+    quiz = Quiz(self.title, [self[index] for index in indices])
+    if rng is not None:
+      shuffle_quiz(quiz, rng)
+    return quiz
+
+
+"""
+Render cache: the problem groups of every quiz built are kept rendered in an
+SQLite database, keyed by a hash of their source, so that the problem groups
+that did not change, or that were copied from another quiz, are neither parsed
+nor rendered again
+"""
+
+# Changes whenever the HTML made for the same problem group changes
+RENDERER_VERSION = 2
+
+RENDER_CACHE_FILE = 'fragments.sqlite'
+
+RENDER_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fragments (
+  key TEXT PRIMARY KEY,
+  value BLOB NOT NULL,
+  size INTEGER NOT NULL,
+  used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fragments_by_use ON fragments (used);
+"""
+
+
+def _code_digest(code, sha1):
+  sha1.update(code.co_code)
+  sha1.update(repr(code.co_names).encode('utf8'))
+  for constant in code.co_consts:
+    if hasattr(constant, 'co_code'):
+      # Functions defined inside (their repr holds an address)
+      _code_digest(constant, sha1)
+    elif isinstance(constant, frozenset):
+      # The order of a set depends on the hash seed of the process
+      sha1.update(repr(sorted(map(repr, constant))).encode('utf8'))
+    else:
+      sha1.update(repr(constant).encode('utf8'))
+
+
+def _handler_digest(handler):
+  """
+  Returns a hash of the code of a markup handler, or its name if it has no
+  Python code
+  """
+  import hashlib
+  code = getattr(handler, '__code__', None)
+  if code is None:
+    return getattr(handler, '__qualname__', repr(handler))
+  sha1 = hashlib.sha1()
+  _code_digest(code, sha1)
+  return sha1.hexdigest()
+
+
+class RenderCache():
+  """
+  Content-addressed cache of rendered problem groups, kept in memory for a run
+  and in filename between runs, evicting the least recently used ones when it
+  holds more than max_size bytes. A problem group is stored rendered in the
+  order of its file, as fragments that can be put in the order of any shuffle
+  (see PrerenderedQuiz), so that the same problem group in another quiz, which
+  is shuffled differently, is found too.
+  """
+  def __init__(self, filename, max_size=64 << 20):
+    import sqlite3
+    self.filename = filename
+    self.max_size = max_size
+    self.memory = {}
+    self.memory_size = 0
+    # Keys used and added since the last flush
+    self.used, self.added = set(), []
+    # The renderer of the problem groups depends on the markup handlers, so
+    # changing the code of one gives new keys
+    self.salt = '%s\0%d\0%s\0' % (__version__, RENDERER_VERSION, ','.join(
+        '%s=%s' % (name, _handler_digest(handler)) for name, handler in
+        sorted(MARKUP_HANDLERS.items())))
+    try:
+      directory = os.path.dirname(filename)
+      if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+      # Worker processes share the database
+      self.connection = sqlite3.connect(filename, timeout=60)
+      # Losing the last entries in a crash is fine for a cache
+      self.connection.execute('PRAGMA journal_mode = WAL')
+      self.connection.execute('PRAGMA synchronous = OFF')
+      self.connection.executescript(RENDER_CACHE_SCHEMA)
+    except (OSError, sqlite3.Error):
+      # The cache is only an optimization, e.g. the directory may be read only
+      self.connection = None
+
+
+  def _key(self, source):
+    import hashlib
+    return hashlib.sha1((self.salt + source).encode('utf8')).hexdigest()
+
+
+  def _lookup(self, keys):
+    """
+    Loads the fragments of the keys that are on disk but not in memory
+    """
+    import pickle
+    keys = [key for key in keys if key not in self.memory]
+    if self.connection is None or not keys:
+      return
+    for start in range(0, len(keys), 500):
+      batch = keys[start:start + 500]
+      for key, value in self.connection.execute(
+          'SELECT key, value FROM fragments WHERE key IN (%s)' % ', '.join('?' * len(batch)),
+          batch):
+        self.memory[key] = pickle.loads(value)
+        self.memory_size += len(value)
+
+
+  def render_quiz(self, text, filename='<string>'):
+    """
+    Returns (title, body) for the text of a quiz, the same as parse_quiz
+    followed by render_quiz, parsing and rendering only the problem groups that
+    are not in the cache
+    """
+    import hashlib
+    # As the parser reads it
+    text = io.StringIO(text, newline=None).read()
+    data = text.encode('utf8')
+    offsets, line_numbers = find_problem_groups(data)
+    end = data.find(b'\n')
+    first_line = data[:end if end >= 0 else len(data)].decode('utf8').strip()
+    head = data[end + 1:offsets[0] if offsets else len(data)] if end >= 0 else b''
+    if head.decode('utf8').strip() or not first_line.startswith('=='):
+      # Questions before the first problem group or a missing title, which the
+      # parser reports
+      quiz = parse_quiz(text, name=filename)
+      return quiz.title, render_quiz(quiz)
+    title = QuizParser(filename, text=text)._parse_title((1, first_line))
+
+    ends = list(offsets[1:]) + [len(data)]
+    sources = [data[start:end].decode('utf8').rstrip() for start, end in zip(offsets, ends)]
+    keys = [self._key(source) for source in sources]
+    self._lookup(keys)
+    fragments = []
+    for key, source, line_number in zip(keys, sources, line_numbers):
+      if key not in self.memory:
+        # A chunk can hold more than one problem group, see find_problem_groups
+        self.memory[key] = [prerender_problem_group(problem_group) for problem_group in
+                            parse_problem_group_chunk(filename, source, line_number)]
+        self.added.append(key)
+      self.used.add(key)
+      fragments.extend(self.memory[key])
+
+    # The page is shuffled as QuizParser.parse would shuffle it
+    seed = hashlib.sha1(data).hexdigest()
+    question_orders, option_orders = shuffle_orders(
+        [[len(options) for question_head, options, close in questions]
+         for head, has_intro, questions in fragments], seed)
+    prerendered = PrerenderedQuiz(Quiz(title))
+    prerendered.problem_groups = fragments
+    return title, prerendered.render(question_orders, option_orders)
+
+
+  def flush(self):
+    """
+    Saves the problem groups rendered since the last flush, and evicts the
+    least recently used ones if the cache is too large
+    """
+    import pickle
+    import sqlite3
+    import time
+    if self.connection is None:
+      return
+    now = time.time()
+    rows = []
+    for key in self.added:
+      value = pickle.dumps(self.memory[key], pickle.HIGHEST_PROTOCOL)
+      rows.append((key, value, len(value), now))
+      self.memory_size += len(value)
+    try:
+      with self.connection:
+        self.connection.executemany('INSERT OR REPLACE INTO fragments VALUES (?, ?, ?, ?)', rows)
+        self.connection.executemany('UPDATE fragments SET used = ? WHERE key = ?',
+                                    [(now, key) for key in self.used])
+        if rows:
+          self._evict()
+    except sqlite3.Error:
+      pass
+    self.used, self.added = set(), []
+    if self.memory_size > self.max_size:
+      # What is saved can be read again
+      self.memory.clear()
+      self.memory_size = 0
+
+
+  def _evict(self):
+    size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM fragments').fetchone()[0]
+    if size <= self.max_size:
+      return
+    evicted = []
+    for key, entry_size in self.connection.execute(
+        'SELECT key, size FROM fragments ORDER BY used'):
+      if size <= self.max_size:
+        break
+      evicted.append((key,))
+      size -= entry_size
+    self.connection.executemany('DELETE FROM fragments WHERE key = ?', evicted)
+    for key, in evicted:
+      self.memory.pop(key, None)
+
+
+  def close(self):
+    self.flush()
+    if self.connection is not None:
+      self.connection.close()
+
+
+# The RenderCache of each database opened by this process, so that it is shared
+# by all the quizzes of a run, including those compiled by the same worker
+_render_caches = {}
+
+
+def get_render_cache(filename, max_size=64 << 20):
+  """
+  Returns the RenderCache of filename for this process
+  """
+  key = (os.path.abspath(filename), max_size)
+  if key not in _render_caches:
+    _render_caches[key] = RenderCache(filename, max_size)
+  return _render_caches[key]
+
+
+def get_render_cache_filename(quiz_filename, cache_dir=None):
+  """
+  Returns where the render cache used for a quiz file is kept: in the
+  __quizcache__ directory next to it, like its parsed version, or in cache_dir
+  """
+  if cache_dir is None:
+    cache_dir = os.path.join(os.path.dirname(quiz_filename), QUIZ_CACHE_DIRECTORY)
+  return os.path.join(cache_dir, RENDER_CACHE_FILE)
+
+
+"""
+Instrumentation
+"""
+
+class _NoStage():
+  """Context manager that does nothing, used when stats are not collected"""
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    return False
+
+
+class NullStats():
+  """Stand-in for BuildStats when instrumentation is off. Costs one call per stage."""
+  enabled = False
+  _no_stage = _NoStage()
+
+  def stage(self, name, filename=None):
+    return self._no_stage
+
+
+NULL_STATS = NullStats()
+
+
+class _Stage():
+  def __init__(self, stats, name, filename):
+    self.stats = stats
+    self.name = name
+    self.filename = filename
+
+  def __enter__(self):
+    self.blocks = sys.getallocatedblocks()
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info):
+    duration = time.perf_counter() - self.start
+    self.stats.records.append((self.name, self.filename, self.start, duration,
+                               sys.getallocatedblocks() - self.blocks, os.getpid()))
+    return False
+
+
+class BuildStats():
+  """
+  Records the wall time and the change in the number of allocated memory blocks
+  of every stage of a build (parse, render, template, write, ...) for every file.
+  Use as: with stats.stage('parse', filename): ...
+  """
+  enabled = True
+
+  def __init__(self):
+    # (stage, filename, start, duration, allocated blocks, pid)
+    self.records = []
+
+
+  def stage(self, name, filename=None):
+    return _Stage(self, name, filename)
+
+
+  def summary(self):
+    """
+    Returns a table of the time spent in each stage, slowest stage first,
+    followed by the slowest files
+    """
+    stages = {}
+    files = {}
+    for name, filename, start, duration, blocks, pid in self.records:
+      count, total, slowest, total_blocks = stages.get(name, (0, 0.0, 0.0, 0))
+      stages[name] = (count + 1, total + duration, max(slowest, duration), total_blocks + blocks)
+      if filename is not None:
+        files[filename] = files.get(filename, 0.0) + duration
+
+    lines = ['%-12s %6s %10s %10s %10s %12s' % ('stage', 'count', 'total (s)', 'mean (ms)',
+                                               'max (ms)', 'blocks')]
+    for name, (count, total, slowest, blocks) in sorted(stages.items(), key=lambda item: -item[1][1]):
+      lines.append('%-12s %6d %10.4f %10.3f %10.3f %12d' % (name, count, total,
+                                                           1000 * total / count, 1000 * slowest, blocks))
+    if files:
+      lines.append('')
+      lines.append('%-50s %10s' % ('slowest files', 'total (s)'))
+      for filename, total in sorted(files.items(), key=lambda item: -item[1])[:10]:
+        lines.append('%-50s %10.4f' % (filename, total))
+    return '\n'.join(lines)
+
+
+  def to_json(self):
+    return [{'stage': name, 'file': filename, 'start': start, 'duration': duration,
+             'blocks': blocks, 'pid': pid}
+            for name, filename, start, duration, blocks, pid in self.records]
+
+
+  def to_trace_events(self):
+    """
+    Returns the records in the Trace Event Format, which can be loaded in
+    chrome://tracing or https://ui.perfetto.dev
+    """
+    events = []
+    for name, filename, start, duration, blocks, pid in self.records:
+      events.append({'name': name, 'cat': 'quizgen', 'ph': 'X', 'pid': pid, 'tid': pid,
+                     'ts': start * 1e6, 'dur': duration * 1e6,
+                     'args': {'file': filename, 'blocks': blocks}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def profile_call(function, *args):
+  """
+  Runs function(*args) under cProfile and prints the most expensive calls
+  """
+  import cProfile
+  import pstats
+  profile = cProfile.Profile()
+  try:
+    return profile.runcall(function, *args)
+  finally:
+    pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+
+
+def compile_quiz(filename, template=None, stats=NULL_STATS, compress=False, html_file_name=None,
+                 stream=False, page_size=None, render_cache=None):
+  """
+  Parses a quiz file and writes the generated HTML next to it (or to
+  html_file_name), using template (by default the one in the current
+  directory), and compressed copies of it if compress is True. The time spent
+  in each stage is recorded in stats. Returns the name of the generated file.
+  With stream=True, the quiz is parsed, rendered and written one problem group
+  at a time, which gives the same page while only holding one problem group in
+  memory (unless the template minifies, as the body is minified as a whole).
+  With page_size, the quiz is split in pages (see write_paginated_quiz).
+  Otherwise, the problem groups found in render_cache (a RenderCache) are
+  neither parsed nor rendered, which is recorded as the render stage.
+  """
+  if template is None:
+    with stats.stage('load'):
+      template = Template.load()
+
+  quiz_parser = QuizParser(filename)
+  if html_file_name is None:
+    html_file_name = get_html_filename(quiz_parser.get_filename())
+
+  if page_size:
+    with stats.stage('paginate', filename):
+      quiz = quiz_parser.stream() if stream else quiz_parser.parse()
+      body = write_paginated_quiz(quiz, html_file_name, page_size, template.minify, compress)
+      title = quiz.title
+  elif stream:
+    with stats.stage('stream', filename):
+      quiz = quiz_parser.stream()
+      with AtomicFile(html_file_name) as out:
+        template.write(out, quiz.title, lambda out: write_quiz(quiz, out))
+    if compress:
+      with stats.stage('compress', filename):
+        write_compressed_copies(html_file_name)
+    else:
+      remove_compressed_copies(html_file_name)
+    return html_file_name
+  elif render_cache is not None:
+    with stats.stage('render', filename):
+      title, body = render_cache.render_quiz(read_quiz_file(filename), quiz_parser.get_filename())
+      render_cache.flush()
+  else:
+    with stats.stage('parse', filename):
+      quiz_filename = quiz_parser.get_filename()
+      quiz = warm(('parsed quiz', os.path.abspath(quiz_filename)), [quiz_filename],
+                  lambda: parse_quiz(read_quiz_file(filename), name=quiz_filename))
+    with stats.stage('render', filename):
+      body = render_quiz(quiz)
+      title = quiz.title
+
+  with stats.stage('template', filename):
+    content = template.render(title, body)
+  with stats.stage('write', filename):
+    data = content.encode('utf8')
+    write_if_changed(html_file_name, data)
+  if compress:
+    with stats.stage('compress', filename):
+      write_compressed_copies(html_file_name, data)
+  else:
+    remove_compressed_copies(html_file_name)
+  return html_file_name
+
+
+def get_build_options(minify, compress, options):
+  """
+  Returns the names of the build options that change the output, for the
+  build manifest: stream gives the same pages and is left out
+  """
+  names = [name for name, enabled in (('minify', minify), ('gzip', compress)) if enabled]
+  if options.get('page_size'):
+    names.append('page_size=%d' % options['page_size'])
+  return names
+
+
+def get_html_filename(filename):
+  """
+  Returns the name of the HTML file generated for a quiz: index or index.quiz
+  both give index.html
+  """
+  if '.quiz' not in filename:
+    filename = '%s.quiz' % filename
+  return filename.replace('.quiz', '.html')
+
+
+def _compile_quiz_reporting_errors(filename, template, collect_stats=False, html_file_name=None,
+                                   render_cache=None, **options):
+  """
+  Runs compile_quiz and returns (filename, html_file_name, error, stats records)
+  instead of raising, so that one bad file does not stop a batch. render_cache
+  is (cache_dir, max_size) of the RenderCache to use (see
+  get_render_cache_filename), as it cannot be sent to worker processes.
+  """
+  stats = BuildStats() if collect_stats else NULL_STATS
+  try:
+    if render_cache is not None:
+      cache_dir, max_size = render_cache
+      render_cache = get_render_cache(get_render_cache_filename(filename, cache_dir), max_size)
+    html_file_name = compile_quiz(filename, template, stats, html_file_name=html_file_name,
+                                  render_cache=render_cache, **options)
+    error = None
+  except Exception as e:
+    html_file_name, error = None, str(e) or e.__class__.__name__
+  return filename, html_file_name, error, getattr(stats, 'records', None)
+
+
+def compile_quizzes(filenames, jobs=1, stats=NULL_STATS, minify=False, **options):
+  """
+  Compiles every quiz file, spreading them over jobs worker processes when jobs
+  is more than one. Yields (filename, html_file_name, error) as files finish.
+  The template is loaded once for the whole batch. The options (compress,
+  stream, page_size) are given to compile_quiz, and render_cache, if given,
+  is the (filename, max_size) of a RenderCache shared by the batch.
+  """
+  with stats.stage('load'):
+    template = Template.load(minify)
+  return _run_compile_tasks([(filename, template, None) for filename in filenames], jobs, stats,
+                            **options)
+
+
+def _run_compile_tasks(tasks, jobs=1, stats=NULL_STATS, **options):
+  """
+  Compiles every (filename, template, html_file_name) task like
+  compile_quizzes, yielding (filename, html_file_name, error)
+  """
+  executor = None
+  if jobs == 1 or len(tasks) < 2:
+    results = (_compile_quiz_reporting_errors(filename, template, stats.enabled, html_file_name,
+                                              **options)
+               for filename, template, html_file_name in tasks)
+  else:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    futures = [executor.submit(_compile_quiz_reporting_errors, filename, template, stats.enabled,
+                               html_file_name, **options)
+               for filename, template, html_file_name in tasks]
+    results = (future.result() for future in as_completed(futures))
+
+  try:
+    for filename, html_file_name, error, records in results:
+      if records:
+        stats.records.extend(records)
+      yield filename, html_file_name, error
+  finally:
+    if executor is not None:
+      executor.shutdown()
+
+
+"""
+Site builds: a whole tree of quizzes is compiled to another directory, with the
+scripts and CSS shared by the pages moved to content-hashed files
+"""
+
+SITE_ASSETS_DIRECTORY = 'assets'
+# Stands for the relative path from a page to the root of the site
+_SITE_ROOT = '[SITE_ROOT]'
+_INLINE_SCRIPT = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+_SCRIPT_TYPE = re.compile(r'''\btype\s*=\s*["']?([^"'\s>]+)''', re.IGNORECASE)
+_SCRIPT_SRC = re.compile(r'\bsrc\s*=', re.IGNORECASE)
+_JAVASCRIPT_TYPES = ('', 'text/javascript', 'application/javascript')
+_ADJACENT_SCRIPTS = re.compile(r'<script src="%s%s/(quiz\.\w+\.js)"></script>\s*'
+                               r'<script src="%s%s/(quiz\.\w+\.js)"></script>' %
+                               ((re.escape(_SITE_ROOT), SITE_ASSETS_DIRECTORY) * 2))
+
+
+def get_asset_name(name, extension, data):
+  """
+  Returns the content-hashed file name of an asset: quiz.0123456789.css
+  """
+  import hashlib
+  return '%s.%s.%s' % (name, hashlib.sha1(data).hexdigest()[:10], extension)
+
+
+def _extract_script(match, assets):
+  """
+  Replaces an inline script by a reference to a content-hashed file, unless it
+  is not JavaScript (or already has a src)
+  """
+  attributes, script = match.group(1), match.group(2)
+  if _SCRIPT_SRC.search(attributes) or not script.strip():
+    return match.group(0)
+  script_type = _SCRIPT_TYPE.search(attributes)
+  script_type = script_type.group(1).lower() if script_type else ''
+  if script_type == 'text/x-mathjax-config':
+    # MathJax only reads inline configuration blocks; from a file, the same code
+    # is run by the AuthorInit hook, which MathJax calls before starting up
+    script = 'window.MathJax = {AuthorInit: function () {%s}};\n' % script
+    name = 'mathjax-config'
+  elif script_type in _JAVASCRIPT_TYPES:
+    name = 'quiz'
+  else:
+    return match.group(0)
+  data = script.encode('utf8')
+  asset_name = get_asset_name(name, 'js', data)
+  assets[asset_name] = data
+  return '<script src="%s%s/%s"></script>' % (_SITE_ROOT, SITE_ASSETS_DIRECTORY, asset_name)
+
+
+def make_site_template(template, assets):
+  """
+  Returns a copy of template whose inline scripts are moved to content-hashed
+  files, which are added to assets (a dict from file name to contents). The
+  paths of the files start with _SITE_ROOT.
+  """
+  site_assets = {}
+  site_template = copy.copy(template)
+  site_template.pieces = [
+      _merge_scripts(_INLINE_SCRIPT.sub(lambda match: _extract_script(match, site_assets), piece),
+                     site_assets) if i % 2 == 0
+      else piece
+      for i, piece in enumerate(template.pieces)]
+  # Only the scripts left after merging are used
+  text = ''.join(site_template.pieces[::2])
+  assets.update((name, data) for name, data in site_assets.items() if name in text)
+  return site_template
+
+
+def _merge_scripts(html, assets):
+  """
+  Merges scripts that follow each other into a single file, so that a page
+  makes one request for them
+  """
+  while True:
+    match = _ADJACENT_SCRIPTS.search(html)
+    if match is None:
+      return html
+    data = assets[match.group(1)] + b'\n' + assets[match.group(2)]
+    asset_name = get_asset_name('quiz', 'js', data)
+    assets[asset_name] = data
+    html = '%s<script src="%s%s/%s"></script>%s' % (
+        html[:match.start()], _SITE_ROOT, SITE_ASSETS_DIRECTORY, asset_name, html[match.end():])
+
+
+def read_quiz_title(filename):
+  """
+  Returns the title of a quiz file, reading only its first line
+  """
+  quiz_parser = QuizParser(filename)
+  with quiz_parser._open() as quiz_file:
+    return quiz_parser._parse_title(next(quiz_parser._iter_lines(quiz_file), (1, '')))
+
+
+def site_index_html(title, subdirectories, quizzes, search_page=None):
+  """
+  Returns the body of the index page of a directory, linking to its
+  subdirectories and to the pages of its quizzes, given as (html file name,
+  title) pairs, with a search box leading to search_page if there is one
+  """
+  items = ['<li><a href="%s/index.html">%s/</a></li>\n' %
+           (escape_attribute(name), escape_html(name)) for name in subdirectories]
+  items.extend('<li><a href="%s">%s</a></li>\n' % (escape_attribute(html_file_name),
+                                                   expand_markup(quiz_title))
+               for html_file_name, quiz_title in quizzes)
+  search = ''
+  if search_page is not None:
+    search = ('<form class="quiz-search" action="%s"><input type="search" name="q" '
+              'placeholder="Search the quizzes"></form>\n' % escape_attribute(search_page))
+  return '<div>\n<h1>%s</h1>\n%s<ul class="index">\n%s</ul>\n</div>\n' % (
+      escape_html(title), search, ''.join(items))
+
+
+def copy_if_changed(source, destination):
+  """
+  Copies a file unless destination already has the same size and time
+  """
+  try:
+    source_stat, destination_stat = os.stat(source), os.stat(destination)
+    if source_stat.st_size == destination_stat.st_size and \
+        int(source_stat.st_mtime) == int(destination_stat.st_mtime):
+      return
+  except OSError:
+    pass
+  import shutil
+  shutil.copy2(source, destination)
+
+
+def _is_site_source(name, quiz_names):
+  """
+  Whether a file of the source tree is an input of the build (or generated
+  from one) rather than a file to copy as is
+  """
+  base, html, _ = name.partition('.html')
+  return name.startswith('.') or name.endswith('.quiz') or name == 'quiz.css' or \
+      name in TEMPLATE_FILES or (html and base + '.quiz' in quiz_names)
+
+
+def build_site(source, output, jobs=1, force=False, minify=False, compress=False,
+               stats=NULL_STATS, search=False, **options):
+  """
+  Compiles every quiz under source to the same place under output and writes an
+  index.html for every directory without an index.quiz. The inline scripts of
+  the template and the CSS (the quiz.css of the directory or of the closest
+  parent, or the default one) are written once to output/assets under
+  content-hashed names, so that they can be cached for as long as browsers
+  allow. Other files, such as images, are copied. With search, a SearchIndex
+  of the quizzes is kept up to date in output/search, along with a search page.
+  Yields (filename, html_file_name, error) like compile_quizzes, which the
+  other options (stream, page_size, render_cache) are given to.
+  """
+  # Directories are walked up to source with os.path.dirname, which a trailing / breaks
+  source = os.path.normpath(source)
+  with stats.stage('load'):
+    assets = {}
+    template = make_site_template(Template.load(minify, source), assets)
+  manifest = BuildManifest(os.path.join(output, MANIFEST_FILE),
+                           ['site'] + get_build_options(minify, compress, options), source)
+  output_path = os.path.realpath(output)
+
+  tasks, keys, indexes, search_quizzes = [], {}, [], []
+  quiz_directories = set()
+  css_by_directory = {}
+  for directory, subdirectories, names in os.walk(source):
+    subdirectories[:] = sorted(
+        name for name in subdirectories if not name.startswith(('.', '_')) and
+        os.path.realpath(os.path.join(directory, name)) != output_path)
+    relative = os.path.relpath(directory, source)
+    depth = 0 if relative == '.' else len(relative.split(os.sep))
+    root = '../' * depth
+    target = os.path.normpath(os.path.join(output, relative))
+    os.makedirs(target, exist_ok=True)
+
+    try:
+      with open(os.path.join(directory, 'quiz.css'), 'rb') as css_file:
+        css = css_file.read()
+    except IOError:
+      css = css_by_directory.get(os.path.dirname(directory), CSS.encode('utf8'))
+    css_by_directory[directory] = css
+    css_name = get_asset_name('quiz', 'css', css)
+    assets[css_name] = css
+    page_template = template.replace(
+        'href="quiz.css"', 'href="%s%s/%s"' % (_SITE_ROOT, SITE_ASSETS_DIRECTORY, css_name))
+    page_template = page_template.replace(_SITE_ROOT, root)
+
+    quiz_names = set(name for name in names if name.endswith('.quiz'))
+    quizzes = []
+    for name in sorted(quiz_names):
+      filename = os.path.join(directory, name)
+      html_file_name = os.path.join(target, get_html_filename(name))
+      key = manifest.key(filename, css_name)
+      if force or not manifest.is_fresh(html_file_name, key):
+        keys[filename] = key
+        tasks.append((filename, page_template, html_file_name))
+      try:
+        quiz_title = read_quiz_title(filename)
+      except Exception:
+        quiz_title = ''
+      quizzes.append((get_html_filename(name), quiz_title or name[:-len('.quiz')]))
+      search_quizzes.append((filename, '/'.join(
+          part for part in relative.split(os.sep) + [get_html_filename(name)] if part != '.')))
+    for name in names:
+      if not _is_site_source(name, quiz_names):
+        copy_if_changed(os.path.join(directory, name), os.path.join(target, name))
+    if quiz_names:
+      # This directory and its parents are listed in the index pages
+      quiz_directory = directory
+      while quiz_directory not in quiz_directories and quiz_directory != os.path.dirname(source):
+        quiz_directories.add(quiz_directory)
+        quiz_directory = os.path.dirname(quiz_directory)
+    if relative == '.':
+      root_template = page_template
+    if 'index.quiz' not in quiz_names:
+      title = 'Quizzes' if relative == '.' else relative.replace(os.sep, '/')
+      indexes.append((directory, os.path.join(target, 'index.html'), page_template, title,
+                      subdirectories, quizzes, root + SEARCH_PAGE if search else None))
+
+  for filename, html_file_name, error in _run_compile_tasks(tasks, jobs, stats,
+                                                            compress=compress, **options):
+    if error is None:
+      manifest.record(html_file_name, keys[filename])
+    yield filename, html_file_name, error
+
+  with stats.stage('index'):
+    for (directory, html_file_name, page_template, title, subdirectories, quizzes,
+         search_page) in indexes:
+      if directory not in quiz_directories:
+        continue
+      subdirectories = [name for name in subdirectories
+                        if os.path.join(directory, name) in quiz_directories]
+      data = page_template.render(title, site_index_html(title, subdirectories, quizzes,
+                                                         search_page))
+      data = data.encode('utf8')
+      write_if_changed(html_file_name, data)
+      update_compressed_copies(html_file_name, compress, data)
+
+  if search:
+    with stats.stage('search'):
+      SearchIndex(os.path.join(output, SEARCH_DIRECTORY), compress).update(search_quizzes)
+      script = SEARCH_SCRIPT.encode('utf8')
+      script_name = get_asset_name('search', 'js', script)
+      assets[script_name] = script
+      data = root_template.render('Search', search_page_html(script_name)).encode('utf8')
+      html_file_name = os.path.join(output, SEARCH_PAGE)
+      write_if_changed(html_file_name, data)
+      update_compressed_copies(html_file_name, compress, data)
+
+  with stats.stage('assets'):
+    assets_directory = os.path.join(output, SITE_ASSETS_DIRECTORY)
+    os.makedirs(assets_directory, exist_ok=True)
+    for name, data in assets.items():
+      asset_filename = os.path.join(assets_directory, name)
+      write_if_changed(asset_filename, data)
+      update_compressed_copies(asset_filename, compress, data)
+    # Assets of previous builds are not used by any page anymore
+    for name in os.listdir(assets_directory):
+      if re.sub(r'\.(gz|br)$', '', name) not in assets:
+        os.remove(os.path.join(assets_directory, name))
+  manifest.save()
+
+
+def build_site_main(argv):
+  import argparse
+  parser = argparse.ArgumentParser(prog='quizgen build-site')
+  parser.add_argument('source')
+  parser.add_argument('output')
+  parser.add_argument('-j', '--jobs', type=int, default=1)
+  parser.add_argument('-f', '--force', action='store_true')
+  parser.add_argument('--minify', action='store_true')
+  parser.add_argument('--gzip', action='store_true')
+  parser.add_argument('--stream', action='store_true')
+  parser.add_argument('--page-size', type=int)
+  parser.add_argument('--render-cache-size', type=int, default=0,
+                      help='keep up to this many megabytes of rendered problem groups')
+  parser.add_argument('--search', action='store_true',
+                      help='write a search index and a search page')
+  args = parser.parse_args(argv)
+  jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+  render_cache = None
+  if args.render_cache_size > 0:
+    render_cache = (os.path.join(args.source, QUIZ_CACHE_DIRECTORY), args.render_cache_size << 20)
+  failed = 0
+  for filename, html_file_name, error in build_site(args.source, args.output, jobs, args.force,
+                                                    args.minify, args.gzip, search=args.search,
+                                                    stream=args.stream,
+                                                    page_size=args.page_size,
+                                                    render_cache=render_cache):
+    if error is not None:
+      failed += 1
+      if filename not in error:
+        error = '%s: %s' % (filename, error)
+      sys.stderr.write(error + '\n')
+  return 1 if failed else 0
+
+
+"""
+Site search: build-site --search writes an inverted index of the quizzes, which
+the search page of the site loads piece by piece from the browser
+"""
+
+SEARCH_DIRECTORY = 'search'
+SEARCH_QUIZZES_FILE = 'quizzes.json'
+SEARCH_PAGE = 'search.html'
+SEARCH_INDEX_VERSION = 2
+# Terms shorter than this, and these words, are not indexed
+SEARCH_MIN_TERM_LENGTH = 2
+SEARCH_STOP_WORDS = frozenset('''
+    an and are as at be by for from has have how if in into is it its no not of on
+    or that the their then there these this to was what when where which who why
+    will with'''.split())
+SEARCH_SNIPPET_LENGTH = 160
+_SEARCH_HIDDEN_MARKUP = re.compile(r'\|\|(?:IMG|LINK):[^|]*\|\||\|\|CODE:[^:|]*:')
+_SEARCH_LATEX_COMMAND = re.compile(r'\\[A-Za-z]+')
+# Made by _search_term_pattern the first time it is needed
+_search_term = None
+_SEARCH_ASCII_SHARD = re.compile(r'^[a-z0-9]+$')
+
+SEARCH_SCRIPT = r"""(function () {
+  var script = document.currentScript;
+  var base = script.getAttribute('data-index');
+  var input = document.querySelector('.quiz-search input');
+  var results = document.querySelector('.quiz-search-results');
+  var maxResults = 50;
+  var files = {};
+  var latest = 0;
+
+  // Loads a file of the index once, calling back with null if it is missing
+  function load(name, callback) {
+    if (files.hasOwnProperty(name)) {
+      if (files[name].loading) {
+        files[name].callbacks.push(callback);
+      } else {
+        callback(files[name].data);
+      }
+      return;
+    }
+    var file = files[name] = {loading: true, callbacks: [callback], data: null};
+    var request = new XMLHttpRequest();
+    request.open('GET', base + name);
+    request.onloadend = function () {
+      if (request.status == 200) {
+        try {
+          file.data = JSON.parse(request.responseText);
+        } catch (e) {
+          file.data = null;
+        }
+      }
+      file.loading = false;
+      file.callbacks.forEach(function (callback) { callback(file.data); });
+    };
+    request.send();
+  }
+
+  function loadAll(names, callback) {
+    var data = {}, left = names.length;
+    if (!left) {
+      callback(data);
+    }
+    names.forEach(function (name) {
+      load(name, function (value) {
+        data[name] = value;
+        if (--left == 0) {
+          callback(data);
+        }
+      });
+    });
+  }
+
+  // The same terms as search_terms in quizgen
+  function terms(text, index) {
+    text = text.replace(/\\[A-Za-z]+/g, ' ').toLowerCase();
+    var words = text.match(/[\p{L}\p{M}\p{N}]+/gu) || [];
+    return words.filter(function (word) {
+      return Array.from(word).length >= index.min_length && index.stop_words.indexOf(word) == -1;
+    });
+  }
+
+  function shard(term) {
+    var prefix = Array.from(term).slice(0, 2).join('');
+    if (/^[a-z0-9]+$/.test(prefix)) {
+      return prefix;
+    }
+    return 'u' + Array.from(new TextEncoder().encode(prefix)).map(function (byte) {
+      return ('0' + byte.toString(16)).slice(-2);
+    }).join('');
+  }
+
+  // Where a term (or any term starting with it) is: question keys
+  // (quiz,group,question) and group keys (quiz,group) for titles and intros
+  function locate(terms, term, prefix) {
+    var found = {questions: {}, groups: {}};
+    Object.keys(terms || {}).forEach(function (candidate) {
+      if (candidate != term && !(prefix && candidate.lastIndexOf(term, 0) == 0)) {
+        return;
+      }
+      var locations = terms[candidate];
+      for (var i = 0; i < locations.length; i += 3) {
+        var group = locations[i] + ',' + locations[i + 1];
+        if (locations[i + 2] < 0) {
+          found.groups[group] = true;
+        } else {
+          found.questions[group + ',' + locations[i + 2]] = true;
+        }
+      }
+    });
+    return found;
+  }
+
+  // The questions whose text (or problem group) has every term, and the
+  // problem groups whose title and intro have every term but no question does
+  function match(located) {
+    var matches = {}, groups = {};
+    located.forEach(function (found) {
+      Object.keys(found.questions).forEach(function (key) {
+        var group = key.slice(0, key.lastIndexOf(','));
+        var everywhere = located.every(function (other) {
+          return other.questions[key] || other.groups[group];
+        });
+        if (everywhere) {
+          matches[key] = groups[group] = true;
+        }
+      });
+    });
+    Object.keys(located[0].groups).forEach(function (group) {
+      if (!groups[group] && located.every(function (other) { return other.groups[group]; })) {
+        matches[group + ',-1'] = true;
+      }
+    });
+    return Object.keys(matches).map(function (key) {
+      return key.split(',').map(Number);
+    }).sort(function (a, b) { return a[0] - b[0] || a[1] - b[1] || a[2] - b[2]; });
+  }
+
+  function show(message, items) {
+    results.textContent = '';
+    var status = document.createElement('p');
+    status.textContent = message;
+    results.appendChild(status);
+    if (items) {
+      var list = document.createElement('ol');
+      items.forEach(function (item) { list.appendChild(item); });
+      results.appendChild(list);
+      if (window.MathJax) {
+        MathJax.Hub.Queue(['Typeset', MathJax.Hub, results]);
+      }
+    }
+  }
+
+  function unique(values) {
+    return values.filter(function (value, i) { return values.indexOf(value) == i; });
+  }
+
+  function resultItem(index, documents, location) {
+    var quiz = index.quizzes[location[0]];
+    var quizDocument = documents['quizzes/' + location[0] + '.json'];
+    var group = quizDocument && quizDocument.groups[location[1]];
+    var item = document.createElement('li');
+    var link = document.createElement('a');
+    link.href = quiz[0];
+    link.textContent = quiz[1] || quiz[0];
+    item.appendChild(link);
+    if (group && group[0]) {
+      var title = document.createElement('div');
+      title.className = 'quiz-search-group';
+      title.textContent = group[0];
+      item.appendChild(title);
+    }
+    if (group && location[2] >= 0) {
+      var question = document.createElement('div');
+      question.className = 'quiz-search-question';
+      question.textContent = group[1][location[2]];
+      item.appendChild(question);
+    }
+    return item;
+  }
+
+  function search(query) {
+    // Only the results of the last query are shown
+    var number = ++latest;
+    load('quizzes.json', function (index) {
+      if (number != latest) {
+        return;
+      }
+      if (!index) {
+        show('The search index could not be loaded.');
+        return;
+      }
+      var words = terms(query, index);
+      if (!words.length) {
+        show('');
+        return;
+      }
+      // The last word is completed while it is being typed
+      var prefix = !/\s$/.test(query);
+      var shards = words.map(function (word) { return 'terms/' + shard(word) + '.json'; });
+      var missing = words.some(function (word) { return index.shards.indexOf(shard(word)) == -1; });
+      loadAll(missing ? [] : unique(shards), function (data) {
+        if (number != latest) {
+          return;
+        }
+        var found = missing ? [] : match(words.map(function (word, i) {
+          return locate(data[shards[i]], word, prefix && i == words.length - 1);
+        }));
+        var shown = found.slice(0, maxResults);
+        var quizzes = unique(shown.map(function (location) {
+          return 'quizzes/' + location[0] + '.json';
+        }));
+        loadAll(quizzes, function (documents) {
+          if (number != latest) {
+            return;
+          }
+          var message = found.length == 1 ? '1 result' : found.length + ' results';
+          if (found.length > maxResults) {
+            message += ', showing the first ' + maxResults;
+          }
+          show(message, shown.map(function (location) {
+            return resultItem(index, documents, location);
+          }));
+        });
+      });
+    });
+  }
+
+  var query = /[?&]q=([^&]*)/.exec(location.search);
+  if (query) {
+    input.value = decodeURIComponent(query[1].replace(/\+/g, ' '));
+    search(input.value);
+  }
+  input.addEventListener('input', function () {
+    if (window.history && history.replaceState) {
+      history.replaceState(null, '', '?q=' + encodeURIComponent(input.value));
+    }
+    search(input.value);
+  });
+})();
+"""
+
+
+def search_text(text):
+  """
+  Returns the text of a quiz field as a student reads it, without the URLs of
+  images and links and the language of code
+  """
+  text = _SEARCH_HIDDEN_MARKUP.sub(' ', text).replace('||', ' ')
+  return ' '.join(text.split())
+
+
+def _search_term_pattern():
+  """
+  Returns the pattern of a term: a run of letters, marks and numbers, as the
+  search page splits queries. Word characters are letters, numbers and the
+  underscore, and re has no class for marks, so these are looked up in the
+  planes of Unicode that have any.
+  """
+  global _search_term
+  if _search_term is None:
+    import unicodedata
+    marks = []
+    for plane in (0, 1, 14):
+      for code in range(plane << 16, (plane + 1) << 16):
+        if unicodedata.category(chr(code)).startswith('M'):
+          if marks and marks[-1][1] == code - 1:
+            marks[-1][1] = code
+          else:
+            marks.append([code, code])
+    _search_term = re.compile('[\\w%s]+' % ''.join(
+        '\\U%08x-\\U%08x' % (first, last) for first, last in marks))
+  return _search_term
+
+
+def search_terms(text):
+  """
+  Returns the terms of a quiz field that are indexed, in order: its words and
+  numbers, but not LaTeX commands. The terms function of the search page
+  splits queries the same way.
+  """
+  text = _SEARCH_LATEX_COMMAND.sub(' ', search_text(text)).lower().replace('_', ' ')
+  return [term for term in _search_term_pattern().findall(text)
+          if len(term) >= SEARCH_MIN_TERM_LENGTH and term not in SEARCH_STOP_WORDS]
+
+
+def search_shard(term):
+  """
+  Returns the name of the shard of the index that holds a term, which is its
+  first two characters (hex encoded unless they are ASCII letters or digits)
+  """
+  prefix = term[:SEARCH_MIN_TERM_LENGTH]
+  if _SEARCH_ASCII_SHARD.match(prefix):
+    return prefix
+  return 'u' + prefix.encode('utf8').hex()
+
+
+def index_quiz(quiz):
+  """
+  Returns (groups, postings) for a quiz. groups holds the title of every
+  problem group and the text of its questions, for showing results. postings
+  maps every term of the quiz to where it is, as a flat list of (problem group,
+  question) numbers in the order of the file; the question is -1 for the title
+  and the intro of the problem group. The options count as part of their
+  question, but not their explanations, which would give the answers away.
+  """
+  groups, postings = [], {}
+
+  def add(text, group, question):
+    for term in dict.fromkeys(search_terms(text)):
+      postings.setdefault(term, []).extend((group, question))
+
+  for group, problem_group in enumerate(quiz.problem_groups):
+    add('%s %s' % (problem_group.title, problem_group.intro), group, -1)
+    snippets = []
+    for question_number, question in enumerate(problem_group.questions):
+      add(' '.join([question.description] + [option.description for option in question.options]),
+          group, question_number)
+      snippet = search_text(question.description)
+      if len(snippet) > SEARCH_SNIPPET_LENGTH:
+        snippet = snippet[:SEARCH_SNIPPET_LENGTH].rsplit(' ', 1)[0] + '...'
+      snippets.append(snippet)
+    groups.append([search_text(problem_group.title), snippets])
+  return groups, postings
+
+
+def _dump_search_file(data):
+  import json
+  return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+class SearchIndex():
+  """
+  The search index of a site, kept in directory:
+  - quizzes.json lists the quizzes (the URL of their page, their title and the
+    signature of their file), the shards and how queries are split into terms
+  - quizzes/N.json holds the problem group titles and question texts of quiz
+    number N, which are shown in the results, and its terms
+  - terms/XX.json maps the terms starting with XX to flat lists of (quiz,
+    problem group, question) numbers, as given by index_quiz
+  A search only loads quizzes.json, the shards of its terms and the quizzes
+  that match. update() only parses the quizzes whose file changed since the
+  last build and only rewrites the shards of the terms they had or have. With
+  compress, the files get the compressed copies of write_compressed_copies.
+  """
+  def __init__(self, directory, compress=False):
+    import json
+    self.directory = directory
+    self.compress = compress
+    # [url, title, signature] for every quiz number, or None for a free number
+    self.quizzes = []
+    self.shards = set()
+    self.complete = False
+    filename = os.path.join(directory, SEARCH_QUIZZES_FILE)
+    try:
+      with open(filename, encoding='utf8') as index_file:
+        index = json.load(index_file)
+      # Turning compression on or off rewrites the whole index
+      if index.get('version') == SEARCH_INDEX_VERSION and \
+          compress == os.path.exists(filename + '.gz'):
+        self.quizzes = index['quizzes']
+        self.shards = set(index['shards'])
+        self.complete = True
+    except (IOError, ValueError, KeyError):
+      pass
+
+
+  def _filename(self, kind, name):
+    return os.path.join(self.directory, kind, '%s.json' % name)
+
+
+  def _load(self, kind, name, default):
+    import json
+    try:
+      with open(self._filename(kind, name), encoding='utf8') as f:
+        return json.load(f)
+    except (IOError, ValueError):
+      return default
+
+
+  def _write(self, kind, name, data):
+    self._write_file(self._filename(kind, name), data)
+
+
+  def _write_file(self, filename, data):
+    """
+    Writes data as JSON to filename, or removes the file if data is None
+    """
+    compressed_filenames = [filename + '.gz', filename + '.br']
+    if data is None:
+      for name in [filename] + compressed_filenames:
+        if os.path.exists(name):
+          os.remove(name)
+      return
+    data = _dump_search_file(data).encode('utf8')
+    if write_if_changed(filename, data) or self.compress != os.path.exists(filename + '.gz'):
+      for name in compressed_filenames:
+        if os.path.exists(name):
+          os.remove(name)
+      if self.compress:
+        write_compressed_copies(filename, data)
+
+
+  def update(self, quizzes):
+    """
+    Brings the index up to date with quizzes, a list of (filename, url) pairs
+    for every quiz of the site, and writes it. A quiz that cannot be parsed
+    keeps its previous entry, the build reports the error. Returns the number
+    of quizzes that were indexed (or removed).
+    """
+    for kind in ('quizzes', 'terms'):
+      directory = os.path.join(self.directory, kind)
+      os.makedirs(directory, exist_ok=True)
+      if not self.complete:
+        # Left by a build that did not finish, or by another version
+        for name in os.listdir(directory):
+          os.remove(os.path.join(directory, name))
+
+    numbers = dict((entry[0], number) for number, entry in enumerate(self.quizzes)
+                   if entry is not None)
+    urls = set(url for _, url in quizzes)
+    # Quiz number -> postings of its new version, or None if it was removed
+    changed = {}
+    for url, number in numbers.items():
+      if url not in urls:
+        self.quizzes[number] = None
+        changed[number] = None
+    documents = {}
+    for filename, url in quizzes:
+      signature = _file_signature(filename)
+      number = numbers.get(url)
+      if signature is None or (number is not None and self.quizzes[number][2] == list(signature)):
+        continue
+      try:
+        quiz = load_quiz(filename, shuffle=False)
+      except Exception:
+        continue
+      if number is None:
+        number = self._free_number()
+      self.quizzes[number] = [url, search_text(quiz.title), list(signature)]
+      groups, changed[number] = index_quiz(quiz)
+      documents[number] = {'groups': groups, 'terms': sorted(changed[number])}
+    if not changed and self.complete:
+      return 0
+
+    # The shards the changed quizzes are in, before and after
+    shards = set()
+    for number, postings in changed.items():
+      old_terms = self._load('quizzes', number, {}).get('terms', [])
+      shards.update(search_shard(term) for term in old_terms)
+      shards.update(search_shard(term) for term in postings or ())
+    for shard in sorted(shards):
+      terms = self._load('terms', shard, {})
+      for term, locations in list(terms.items()):
+        locations = [number for i in range(0, len(locations), 3)
+                     if locations[i] not in changed for number in locations[i:i + 3]]
+        if locations:
+          terms[term] = locations
+        else:
+          del terms[term]
+      for number, postings in sorted(changed.items()):
+        for term, locations in (postings or {}).items():
+          if search_shard(term) == shard:
+            entry = terms.setdefault(term, [])
+            for i in range(0, len(locations), 2):
+              entry.extend((number, locations[i], locations[i + 1]))
+      for term, locations in terms.items():
+        # In the order of the quizzes, as a full build writes them
+        triples = [locations[i:i + 3] for i in range(0, len(locations), 3)]
+        triples.sort(key=lambda triple: triple[0])
+        terms[term] = [number for triple in triples for number in triple]
+      if terms:
+        self.shards.add(shard)
+        self._write('terms', shard, terms)
+      else:
+        self.shards.discard(shard)
+        self._write('terms', shard, None)
+    for number in changed:
+      self._write('quizzes', number, documents.get(number))
+
+    while self.quizzes and self.quizzes[-1] is None:
+      self.quizzes.pop()
+    self._write_file(os.path.join(self.directory, SEARCH_QUIZZES_FILE), {
+      'version': SEARCH_INDEX_VERSION,
+      'quizzes': self.quizzes,
+      'shards': sorted(self.shards),
+      'min_length': SEARCH_MIN_TERM_LENGTH,
+      'stop_words': sorted(SEARCH_STOP_WORDS),
+    })
+    self.complete = True
+    return len(changed)
+
+
+  def _free_number(self):
+    for number, entry in enumerate(self.quizzes):
+      if entry is None:
+        return number
+    self.quizzes.append(None)
+    return len(self.quizzes) - 1
+
+
+def search_page_html(script_name):
+  """
+  Returns the body of the search page of a site, which is at its root
+  """
+  return ('<div class="quiz-search">\n<h1>Search</h1>\n'
+          '<form action="%s"><input type="search" name="q" autofocus '
+          'placeholder="Search the quizzes"></form>\n'
+          '<div class="quiz-search-results"></div>\n</div>\n'
+          '<script src="%s/%s" data-index="%s/"></script>\n' % (
+              SEARCH_PAGE, SITE_ASSETS_DIRECTORY, script_name, SEARCH_DIRECTORY))
+
+
+"""
+Checking quizzes: parsing them for every syntax error, without rendering them
+"""
+
+def check_quiz_file(filename):
+  """
+  Returns a (filename, line number, message) tuple for every syntax error of
+  the quiz file. A file that cannot be read is reported at line 0.
+  """
+  try:
+    errors = QuizParser(filename).check()
+  except Exception as e:
+    return [(filename, 0, str(e) or e.__class__.__name__)]
+  return [(error.filename, error.line_number, error.message) for error in errors]
+
+
+def check_quizzes(filenames, jobs=1):
+  """
+  Yields the errors of check_quiz_file for every file, in the order of
+  filenames, spreading the files over jobs worker processes when jobs is more
+  than one
+  """
+  if jobs == 1 or len(filenames) < 2:
+    results = map(check_quiz_file, filenames)
+    for errors in results:
+      for error in errors:
+        yield error
+    return
+
+  from concurrent.futures import ProcessPoolExecutor
+  with ProcessPoolExecutor(max_workers=jobs) as executor:
+    # Quiz files are quick to parse, so they are sent to the workers in batches
+    chunksize = max(1, len(filenames) // (jobs * 4))
+    for errors in executor.map(check_quiz_file, filenames, chunksize=chunksize):
+      for error in errors:
+        yield error
+
+
+def check_main(argv):
+  import argparse
+  import json
+  parser = argparse.ArgumentParser(prog='quizgen check')
+  parser.add_argument('paths', nargs='+')
+  parser.add_argument('-j', '--jobs', type=int, default=1)
+  parser.add_argument('--format', choices=('text', 'json'), default='text',
+                      help='FILE:LINE: MESSAGE lines, or one JSON object per line')
+  args = parser.parse_args(argv)
+  jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+  failed = 0
+  for filename, line_number, message in check_quizzes(expand_quiz_filenames(args.paths), jobs):
+    failed += 1
+    if args.format == 'json':
+      print (json.dumps({'file': filename, 'line': line_number, 'message': message}))
+    else:
+      print ('%s:%d: %s' % (filename, line_number, message))
+  return 1 if failed else 0
+
+
+# Commands that can be given as the first argument, e.g. quizgen serve DIR
+COMMANDS = {
+  'serve': serve_main,
+  'build-site': build_site_main,
+  'bank': bank_main,
+  'grade': grade_main,
+  'check': check_main,
+}
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  if argv in ([], ['-h'], ['--help']):
+    # Without loading argparse, since this is all most runs of a new user do
+    usage()
+    return 0
+  if warm_cache is None and argv and not is_local_command(argv):
+    # Forward the command to the daemon if there is one
+    socket_path = get_daemon_socket()
+    if socket_path is not None and is_trusted_socket(socket_path):
+      status = run_in_daemon(socket_path, argv)
+      if status is not None:
+        return status
+
+  if argv and argv[0] in COMMANDS:
+    return COMMANDS[argv[0]](argv[1:])
+
+  import argparse
+  parser = argparse.ArgumentParser(prog='quizgen', add_help=False)
+  parser.add_argument('-h', '--help', action='store_true')
+  parser.add_argument('-c', '--create-sample', action='store_true')
+  parser.add_argument('-j', '--jobs', type=int, default=1)
+  parser.add_argument('-f', '--force', action='store_true')
+  parser.add_argument('-w', '--watch', action='store_true')
+  parser.add_argument('--stats', action='store_true')
+  parser.add_argument('--stats-json')
+  parser.add_argument('--trace')
+  parser.add_argument('--profile')
+  parser.add_argument('--variants', type=int)
+  parser.add_argument('--seed', default='0')
+  parser.add_argument('--cache-dir')
+  parser.add_argument('--minify', action='store_true')
+  parser.add_argument('--gzip', action='store_true')
+  parser.add_argument('--stream', action='store_true')
+  parser.add_argument('--page-size', type=int)
+  parser.add_argument('--render-cache-size', type=int, default=0)
+  parser.add_argument('--daemon', action='store_true')
+  parser.add_argument('--socket')
+  parser.add_argument('filenames', nargs='*')
+  args = parser.parse_args(argv)
+
+  if args.daemon:
+    socket_path = args.socket or get_daemon_socket()
+    try:
+      if socket_path is None:
+        raise Exception('--daemon needs Unix sockets')
+      run_daemon(socket_path)
+    except Exception as e:
+      sys.stderr.write('%s\n' % e)
+      return 1
+    return 0
+  if args.help or not (args.filenames or args.create_sample or args.profile):
+    usage()
+    return 0
+  if args.create_sample:
+    create_sample()
+    return 0
+
+  options = {'compress': args.gzip, 'stream': args.stream, 'page_size': args.page_size}
+  if args.render_cache_size > 0:
+    options['render_cache'] = (args.cache_dir, args.render_cache_size << 20)
+  manifest_options = get_build_options(args.minify, args.gzip, options)
+
+  if args.watch:
+    try:
+      QuizWatcher(args.filenames, manifest=BuildManifest(options=manifest_options),
+                  minify=args.minify, **options).run()
+    except KeyboardInterrupt:
+      pass
+    return 0
+
+  if args.variants:
+    template = Template.load()
+    failed = 0
+    for filename in expand_quiz_filenames(args.filenames):
+      try:
+        print ('Wrote %d variants and %s' % (args.variants,
+            write_variants(filename, args.variants, args.seed, template, args.cache_dir)))
+      except Exception as e:
+        failed += 1
+        sys.stderr.write('%s\n' % e)
+    create_css()
+    return 1 if failed else 0
+
+  if args.profile:
+    # Compile a single file under the profiler, ignoring the build manifest
+    profile_call(compile_quiz, args.profile)
+    return 0
+
+  stats = BuildStats() if (args.stats or args.stats_json or args.trace) else NULL_STATS
+
+  # Skip the quizzes whose inputs have not changed since they were last built
+  with stats.stage('manifest'):
+    manifest = BuildManifest(options=manifest_options)
+    keys = {}
+    for filename in expand_quiz_filenames(args.filenames):
+      html_file_name = get_html_filename(filename)
+      key = manifest.key(QuizParser(filename).get_filename())
+      if args.force or not manifest.is_fresh(html_file_name, key):
+        keys[filename] = key
+
+  jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+  failed = 0
+  for filename, html_file_name, error in compile_quizzes(list(keys), jobs, stats, args.minify,
+                                                        **options):
+    if error is not None:
+      failed += 1
+      if filename not in error:
+        error = '%s: %s' % (filename, error)
+      sys.stderr.write(error + '\n')
+    else:
+      manifest.record(html_file_name, keys[filename])
+  manifest.save()
+  # Done once from the parent process, after the workers are finished
+  create_css()
+
+  if args.stats:
+    sys.stderr.write(stats.summary() + '\n')
+  import json
+  if args.stats_json:
+    with open(args.stats_json, 'w', encoding='utf8') as stats_file:
+      json.dump(stats.to_json(), stats_file, indent=1)
+  if args.trace:
+    with open(args.trace, 'w', encoding='utf8') as trace_file:
+      json.dump(stats.to_trace_events(), trace_file)
+  return 1 if failed else 0
+
+
+
+SAMPLE = """== Sample Quiz Title
+[Problem Group 1 Title]
+This is the statement for problem group one.
+You can add a link to websites like this: ||LINK: http://www.google.com||.
+You can add images like this:
+||IMG:http://upload.wikimedia.org/wikipedia/commons/9/9b/Carl_Friedrich_Gauss.jpg||
+The image source can either be a local path, or some web URL. Images can be embedded
+anywhere: within problem groups, problems or options.
+Quizgen supports LaTeX:
+\[
+a = \\begin{pmatrix} 1 \\\\ 3 \\\\ 2 \end{pmatrix} , \quad
+b = \\begin{pmatrix} 2 \\\\ 6 \\\\ 4 \end{pmatrix} , \quad
+c = \\begin{pmatrix} 1 \\\\ 3 \\\\ 0 \end{pmatrix} .
+\]
+A blank line marks the end of this problem group introduction text and the
+beginning of the first problem.
+
+This is the first problem in the problem group with some LaTeX: $a_3$.
+* This is an option. :: You can add an explanation for an option after the double colon to explain why it is correct/incorrect.
+* This is another option. Observe that explanations are optional.
+*= This option is the correct option since it is marked with an equal to sign.
+
+Again, a blank line marks the end of the options. Here's another problem in
+this problem group with more inline latex $c$ and $d$.
+Quizgen supports displayed equations as well:
+\[
+x=Zy + a - c.
+\]
+* Yes.
+*= No.
+
+You can also have problems with multiple correct responses.
+Students will be asked to select all that apply, and then submit their
+responses.
+*= Option 1. :: This option is correct.
+* Option 2. :: This option is not correct.
+* Option 3.
+*= Option 4. :: This is another correct option.
+
+[]
+This problem group has no title and has no introduction. When the text following the start of a new problem group is immediately followed by the options, it is inferred to be a problem.
+*= Yes I understand. :: Great! Here's some latex $\|a + b + c\|.$
+* No. :: Please email me and I'll try to help!
+
+This is another problem in this problem group.
+* This is a great tutorial!
+*= This tutorial can be improved. I'm going to email you with suggestions so you can do a better job.
+"""
+
+# HTML template
+# TODO: Don't judge, I didn't want to do this
+HTML = r"""
+<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="UTF-8" />
+    <title>Quiz</title>
+    <link href='http://fonts.googleapis.com/css?family=Josefin+Sans|Alike' rel='stylesheet' type='text/css'>
+    <link rel="stylesheet" href="quiz.css" type="text/css" />
+    <script src="http://ajax.googleapis.com/ajax/libs/jquery/1.7.1/jquery.min.js"></script>
+    <script type="text/x-mathjax-config">
+      MathJax.Hub.Config({
+        tex2jax: {
+          inlineMath: [ ['$','$'], ["\\(","\\)"] ],
+          processEscapes: true
+        }
+      });
+    </script>
+    <script type="text/javascript" src="http://cdn.mathjax.org/mathjax/latest/MathJax.js?config=TeX-AMS_HTML.js"></script>
+    <link rel="stylesheet" href="http://cdnjs.cloudflare.com/ajax/libs/highlight.js/8.2/styles/default.min.css">
+    <script src="http://cdnjs.cloudflare.com/ajax/libs/highlight.js/8.2/highlight.min.js"></script>
+    <script>hljs.initHighlightingOnLoad();</script>
+
+    <script type="text/javascript">
+    $(document).ready(function(){
+      //close all the content divs on page load
+      $('.response').hide();
+
+      // toggle slide. The handlers are delegated so that they also work for
+      // content loaded later, such as the pages of a paginated quiz
+      $(document).on('click', '.selection', function(){
+        // by calling sibling, we can use same div for all demos
+        $(this).siblings('.response').slideToggle('fast');
+      });
+
+      $(document).on('click', 'button', function(event){
+        var $target = $(event.target);
+        var $checkboxes = $target.parent('.mcq').find('input');
+        for (var i = 0; i < $checkboxes.length; i++) {
+          var $checkbox = $checkboxes.eq(i);
+          a = $checkbox;
+          if ($checkbox[0].checked && $checkbox.nextAll('.response').hasClass('right')) {
+            $checkbox.nextAll('.correct-checkbox').show();
+          } else if ($checkbox[0].checked &&
+              $checkbox.nextAll('.response').hasClass('wrong')) {
+            $checkbox.nextAll('.incorrect-checkbox').show();
+          } else if (!$checkbox[0].checked &&
+              $checkbox.nextAll('.response').hasClass('right')) {
+            $checkbox.nextAll('.incorrect-checkbox').show();
+          } else {
+            $checkbox.nextAll('.correct-checkbox').show();
+          }
+        }
+        $target.parent('.mcq').find('.response').slideToggle('fast');
+        if ($target.text() == 'Submit') {
+          $target.text('Hide');
+        } else {
+          $checkboxes.nextAll('.incorrect-checkbox').hide();
+          $checkboxes.nextAll('.correct-checkbox').hide();
+          $target.text('Submit');
+        }
+      });
+    });
+    </script>
+  </head>
+
+<body>
+  $\newcommand{\ones}{\mathbf 1}$
+  [HEADER]
+  [BODY]
+  <footer>
+  [FOOTER]
+  </footer>
+</body>
+</html>
+"""
+
+DEFAULT_FOOTER = 'Page generated using <a href=\"https://github.com/karanveerm/quizgen\">Quizgen</a>'
+
+# CSS template
+# TODO: This is not something I'm proud of
+CSS = """html {
+  min-height: 100%;
+}
+
+body {
+  margin-left: auto;
+  margin-right: auto;
+  padding: 0;
+  font-family: 'PT Sans', 'Helvetica Neue', Helvetica, Arial, Sans-serif;
+  font-size: 16px;
+  position: relative;
+  min-height: 100%;
+  width: 680px;
+  background-color: rgb(250, 250, 250);
+  color: #333;
+}
+
+img {
+  height: 400px;
+  display: block;
+  margin-left: auto;
+  margin-right: auto;
+  padding: 20px;
+}
+
+div .description {
+  margin-top: 30px;
+}
+
+a {
+  color: #000066;
+}
+
+div .selection {
+  color: #000066;
+  text-decoration: none;
+}
+
+div .selection:hover {
+  text-decoration: underline;
+}
+
+
+span.right {
+  color:#008800;
+}
+
+hr {
+  width: 60%;
+  margin-left: 0px;
+  border: 0px;
+  border-bottom: 1px solid #ccc;
+}
+
+fieldset {
+  border: 0px;
+  border-bottom: 2.5px solid #aaa;
+  padding: 10px 20px;
+  padding-left: 0px;
+  margin-bottom: 0px;
+  margin-top: 0px;
+}
+
+ol ul {
+  padding-top: 10px;
+  padding-bottom: 10px;
+}
+
+.selection {
+  cursor: pointer;
+  margin-top: 5px;
+}
+
+.multiple-selection {
+  cursor: pointer;
+  margin-top: 5px;
+}
+
+.correct-checkbox {
+  color: #4F8A10;
+  display: none;
+}
+
+.incorrect-checkbox {
+  color: #D8000C;
+  display: none;
+}
+
+legend {
+  font-family: Alike, 'Josefin Sans';
+  font-size: 19px;
+  padding-left: 0px;
+}
+
+
+.response.wrong{
+  padding: 8px 10px;
+  color: #D8000C;
+  background-color: #FFBABA;
+}
+
+.response.right{
+  padding: 8px 10px;
+  color: #4F8A10;
+  background-color: #DFF2BF;
+}
+
+footer {
+  font-size: 12px;
+  margin-top: 0px;
+  margin-bottom: 5px;
+  bottom: 0;
+  width: 100%;
+}
+
+label {
+  display: block;
+  padding-top: 5px;
+  padding-bottom: 5px;
+}
+
+button {
+  background: #bbb;
+  border: 0px;
+  color: #ffffff;
+  font-size: 14px;
+  padding: 6px 12px 6px 12px;
+  text-decoration: none;
+}
+
+button:hover{
+  background: #ccc;
+}
+
+button:focus {
+    outline: none;
+}
+
+.quiz-pages {
+  text-align: center;
+  padding: 10px;
+}
+
+.quiz-pages a {
+  padding: 4px 8px;
+  text-decoration: none;
+}
+
+.quiz-pages a.current {
+  font-weight: bold;
+}
+"""